@@ -1,31 +1,130 @@
-import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
-if __name__ == "__main__":
-    
-    pth_to_data = "~/dataset/ebnerd_small"
+# size of the file buffer of each atomic file, so rows reach the OS in large writes
+write_buffer_size = 1 << 20
+# number of rows formatted by the csv writers at a time
+write_batch_size = 65536
+# low-cardinality string columns, kept dictionary encoded from parquet pages to csv
+dictionary_columns = {'category_str'}
+
+
+def parquet_to_atomic(src, columns, header, dst):
+    r"""Convert the selected columns of a Parquet file into a RecBole atomic file.
+
+    The file is streamed one row group at a time, so peak memory is bounded by the largest row group
+    rather than the whole table. Rows with null values are dropped in Arrow without going through a
+    pandas copy. The header is written as is, since RecBole splits it without unquoting.
+
+    Args:
+        src (str): path of the source Parquet file.
+        columns (list of str): columns to be read from :attr:`src`.
+        header (list of str): atomic header of each column, in the same order as :attr:`columns`.
+        dst (str): path of the output atomic file.
+    """
+    parquet_file = pq.ParquetFile(src, read_dictionary=[column for column in columns if column in dictionary_columns])
+    schema = parquet_file.schema_arrow
+    schema = pa.schema([schema.field(column) for column in columns])
+    # only free-text columns may contain separators or quotes, id and numeric columns are never quoted
+    has_text = any(
+        pa.types.is_string(field.type) or pa.types.is_large_string(field.type) or pa.types.is_dictionary(field.type)
+        for field in schema
+    )
+    write_options = pacsv.WriteOptions(
+        include_header=False, batch_size=write_batch_size, quoting_style='needed' if has_text else 'none'
+    )
+    with open(dst, 'wb', buffering=write_buffer_size) as f:
+        f.write((','.join(header) + '\n').encode())
+        with pacsv.CSVWriter(f, schema, write_options=write_options) as writer:
+            for i in range(parquet_file.num_row_groups):
+                writer.write_table(parquet_file.read_row_group(i, columns=columns).drop_null())
+
+
+def parquet_to_atomic_pandas(src, columns, header, dst):
+    r"""Same as :func:`parquet_to_atomic`, but goes through a pandas DataFrame.
+
+    Columns are read as pyarrow-backed arrays, so the null filter works on the Arrow data directly
+    instead of first copying every column into numpy blocks. Rows are written in batches to bound
+    the size of the strings built by ``to_csv``.
+    """
+    df = pd.read_parquet(src, columns=columns, dtype_backend='pyarrow')
+    df = df.dropna().set_axis(header, axis=1)
+    with open(dst, 'w', buffering=write_buffer_size, newline='') as f:
+        for start in range(0, max(len(df), 1), write_batch_size):
+            df.iloc[start:start + write_batch_size].to_csv(f, header=(start == 0), index=False)
+
+
+def parquet_to_atomic_polars(src, columns, header, dst):
+    r"""Same as :func:`parquet_to_atomic`, but runs as a single streaming Polars query.
 
-    pth_to_behaviors = os.path.join(pth_to_data, "train", "behaviors.parquet")
-    
-    pth_to_history = os.path.join(pth_to_data, "train", "history.parquet")
+    Note:
+        Polars is not a dependency of RecBole, it is only imported when this engine is selected.
+    """
+    import polars as pl
+
+    pl.scan_parquet(src) \
+        .select([pl.col(column).alias(name) for column, name in zip(columns, header)]) \
+        .drop_nulls() \
+        .sink_csv(dst)
+
+
+def parquet_to_atomic_duckdb(src, columns, header, dst):
+    r"""Same as :func:`parquet_to_atomic`, but lets DuckDB copy the Parquet file into CSV.
+
+    Note:
+        DuckDB is not a dependency of RecBole, it is only imported when this engine is selected.
+    """
+    import duckdb
+
+    select = ', '.join(f'"{column}" AS "{name}"' for column, name in zip(columns, header))
+    not_null = ' AND '.join(f'"{column}" IS NOT NULL' for column in columns)
+    with duckdb.connect() as con:
+        con.execute(
+            f"COPY (SELECT {select} FROM read_parquet(?) WHERE {not_null}) "
+            f"TO '{dst}' (HEADER, DELIMITER ',')", [src]
+        )
+
+
+engines = {
+    'pyarrow': parquet_to_atomic,
+    'pandas': parquet_to_atomic_pandas,
+    'polars': parquet_to_atomic_polars,
+    'duckdb': parquet_to_atomic_duckdb,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--engine', '-e', type=str, default='pyarrow', choices=engines.keys(),
+                        help='library used to convert parquet files')
+    parser.add_argument('--workers', '-w', type=int, default=3, help='number of files converted in parallel')
 
-    pth_to_items = os.path.join(pth_to_data, "articles.parquet")
+    args, _ = parser.parse_known_args()
+    convert = engines[args.engine]
 
-    behaviors = pd.read_parquet(pth_to_behaviors)
+    pth_to_data = Path("~/dataset/ebnerd_small").expanduser()
 
-    interactions = behaviors[['user_id', 'article_id']]
-    inter_header = ["user_id:token", "item_id:token"]
-    interactions.dropna(inplace=True)
-    interactions.to_csv("ebnerd_test.inter", header=inter_header, index=False)
+    pth_to_behaviors = str(pth_to_data / "train" / "behaviors.parquet")
 
+    pth_to_history = str(pth_to_data / "train" / "history.parquet")
 
-    articles = pd.read_parquet(pth_to_items)
-    articles = articles[['article_id', 'title', 'category_str']]
-    articles_header = ['item_id:token',	'news_title:token_seq',	'genre:token']
-    articles.dropna(inplace=True)
-    articles.to_csv("ebnerd_test.item", header=articles_header, index=False)
+    pth_to_items = str(pth_to_data / "articles.parquet")
 
-    users = behaviors[['user_id', 'gender', 'age']]
-    users_header = ['use_id:token',	'gender:float',	'age:float']
-    users.dropna(inplace=True)
-    users.to_csv("ebnerd_test.user", header=users_header, index=False)
\ No newline at end of file
+    # the three atomic files are independent, so they are converted in separate processes
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(convert, pth_to_behaviors, ['user_id', 'article_id'],
+                            ['user_id:token', 'item_id:token'], "ebnerd_test.inter"),
+            executor.submit(convert, pth_to_items, ['article_id', 'title', 'category_str'],
+                            ['item_id:token', 'news_title:token_seq', 'genre:token'], "ebnerd_test.item"),
+            executor.submit(convert, pth_to_behaviors, ['user_id', 'gender', 'age'],
+                            ['use_id:token', 'gender:float', 'age:float'], "ebnerd_test.user"),
+        ]
+        for future in futures:
+            future.result()
@@ -49,6 +49,8 @@ class AbstractDataLoader:
         self.batch_size = self.step = self.model = None
         self.shuffle = shuffle
         self.pr = 0
+        # page-locked batches can be copied to the GPU asynchronously
+        self.pin_memory = bool(config['pin_memory']) and config['device'].type == 'cuda'
         self._init_batch_size_and_step()
 
     def _init_batch_size_and_step(self):
@@ -62,6 +64,7 @@ class AbstractDataLoader:
             config (Config): The new config of dataloader.
         """
         self.config = config
+        self.pin_memory = bool(config['pin_memory']) and config['device'].type == 'cuda'
         self._init_batch_size_and_step()
 
     def __len__(self):
@@ -76,7 +79,10 @@ class AbstractDataLoader:
         if self.pr >= self.pr_end:
             self.pr = 0
             raise StopIteration()
-        return self._next_batch_data()
+        batch_data = self._next_batch_data()
+        if self.pin_memory:
+            batch_data = self._pin_memory(batch_data)
+        return batch_data
 
     @property
     def pr_end(self):
@@ -96,6 +102,21 @@ class AbstractDataLoader:
         """
         raise NotImplementedError('Method [next_batch_data] should be implemented.')
 
+    def _pin_memory(self, data):
+        """Copy the Tensors of a batch returned by :meth:`_next_batch_data` into pinned memory.
+
+        Args:
+            data (Interaction, torch.Tensor, tuple or None): the batch data.
+
+        Returns:
+            The batch data with the same structure, whose Tensors are in pinned memory.
+        """
+        if isinstance(data, (Interaction, torch.Tensor)):
+            return data.pin_memory()
+        if isinstance(data, (tuple, list)):
+            return type(data)(self._pin_memory(d) for d in data)
+        return data
+
     def set_batch_size(self, batch_size):
         """Reset the batch_size of the dataloader, but it can't be called when dataloader is being iterated.
 
@@ -134,20 +134,19 @@ class NegSampleEvalDataLoader(NegSampleDataLoader):
         if self.neg_sample_args['strategy'] == 'by':
             uid_list = self.uid_list[self.pr:self.pr + self.step]
             data_list = []
-            idx_list = []
-            positive_u = []
             positive_i = torch.tensor([], dtype=torch.int64)
 
             for idx, uid in enumerate(uid_list):
                 index = self.uid2index[uid]
                 data_list.append(self._neg_sampling(self.dataset[index]))
-                idx_list += [idx for i in range(self.uid2items_num[uid] * self.times)]
-                positive_u += [idx for i in range(self.uid2items_num[uid])]
                 positive_i = torch.cat((positive_i, self.dataset[index][self.iid_field]), 0)
 
             cur_data = cat_interactions(data_list)
-            idx_list = torch.from_numpy(np.array(idx_list))
-            positive_u = torch.from_numpy(np.array(positive_u))
+            # row of each interaction in the scores matrix, as int64 so that it can index tensors directly
+            items_num = self.uid2items_num[uid_list]
+            user_idx = np.arange(len(uid_list), dtype=np.int64)
+            idx_list = torch.from_numpy(np.repeat(user_idx, items_num * self.times))
+            positive_u = torch.from_numpy(np.repeat(user_idx, items_num))
 
             self.pr += self.step
 
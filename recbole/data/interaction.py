@@ -171,13 +171,15 @@ class Interaction(object):
         """
         return list(self.interaction.keys())
 
-    def to(self, device, selected_field=None):
+    def to(self, device, selected_field=None, non_blocking=False):
         """Transfer Tensors in this Interaction object to the specified device.
 
         Args:
             device (torch.device): target device.
             selected_field (str or iterable object, optional): if specified, only Tensors
             with keys in selected_field will be sent to device.
+            non_blocking (bool, optional): if ``True`` and the Tensors are in pinned memory,
+            the copies are asynchronous with respect to the host. Defaults to ``False``.
 
         Returns:
             Interaction: a coped Interaction object with Tensors which are sent to
@@ -191,12 +193,12 @@ class Interaction(object):
             selected_field = set(selected_field)
             for k in self.interaction:
                 if k in selected_field:
-                    ret[k] = self.interaction[k].to(device)
+                    ret[k] = self.interaction[k].to(device, non_blocking=non_blocking)
                 else:
                     ret[k] = self.interaction[k]
         else:
             for k in self.interaction:
-                ret[k] = self.interaction[k].to(device)
+                ret[k] = self.interaction[k].to(device, non_blocking=non_blocking)
         return Interaction(ret)
 
     def cpu(self):
@@ -210,6 +212,17 @@ class Interaction(object):
             ret[k] = self.interaction[k].cpu()
         return Interaction(ret)
 
+    def pin_memory(self):
+        """Copy Tensors in this Interaction object into pinned memory.
+
+        Returns:
+            Interaction: a coped Interaction object with Tensors which are in pinned memory.
+        """
+        ret = {}
+        for k in self.interaction:
+            ret[k] = self.interaction[k].pin_memory()
+        return Interaction(ret)
+
     def numpy(self):
         """Transfer Tensors to numpy arrays.
 
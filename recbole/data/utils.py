@@ -155,18 +155,54 @@ def data_preparation(config, dataset):
         if config['save_dataloaders']:
             save_split_dataloaders(config, dataloaders=(train_data, valid_data, test_data))
 
+    _log_dataloader_args(config)
+    return train_data, valid_data, test_data
+
+
+def valid_data_preparation(config, dataset):
+    """Split the dataset as :func:`data_preparation` does, but only create the validation dataloader.
+
+    Note:
+        The validation dataloader is not saved by :func:`save_split_dataloaders`, which needs all the split
+        dataloaders.
+
+    Args:
+        config (Config): An instance object of Config, used to record parameter information.
+        dataset (Dataset): An instance object of Dataset, which contains all interaction records.
+
+    Returns:
+        tuple:
+            - train_dataset (Dataset): The training split, which the model is built on.
+            - valid_data (AbstractDataLoader): The dataloader for validation.
+    """
+    built_datasets = dataset.build()
+    train_dataset, valid_dataset, _ = built_datasets
+    _, valid_sampler, _ = create_samplers(config, dataset, built_datasets)
+    valid_data = get_dataloader(config, 'evaluation')(config, valid_dataset, valid_sampler, shuffle=False)
+
+    _log_dataloader_args(config, train=False)
+    return train_dataset, valid_data
+
+
+def _log_dataloader_args(config, train=True):
+    """Log the arguments of the dataloaders created by :func:`data_preparation`.
+
+    Args:
+        config (Config): An instance object of Config, used to record parameter information.
+        train (bool, optional): Whether the training dataloader is created. Defaults to ``True``.
+    """
     logger = getLogger()
-    logger.info(
-        set_color('[Training]: ', 'pink') + set_color('train_batch_size', 'cyan') + ' = ' +
-        set_color(f'[{config["train_batch_size"]}]', 'yellow') + set_color(' negative sampling', 'cyan') + ': ' +
-        set_color(f'[{config["neg_sampling"]}]', 'yellow')
-    )
+    if train:
+        logger.info(
+            set_color('[Training]: ', 'pink') + set_color('train_batch_size', 'cyan') + ' = ' +
+            set_color(f'[{config["train_batch_size"]}]', 'yellow') + set_color(' negative sampling', 'cyan') + ': ' +
+            set_color(f'[{config["neg_sampling"]}]', 'yellow')
+        )
     logger.info(
         set_color('[Evaluation]: ', 'pink') + set_color('eval_batch_size', 'cyan') + ' = ' +
         set_color(f'[{config["eval_batch_size"]}]', 'yellow') + set_color(' eval_args', 'cyan') + ': ' +
         set_color(f'[{config["eval_args"]}]', 'yellow')
     )
-    return train_data, valid_data, test_data
 
 
 def get_dataloader(config, phase):
@@ -22,36 +22,61 @@ class DataStruct(object):
 
     def __init__(self):
         self._data_dict = {}
+        # tensors collected batch by batch, which are concatenated when they are read
+        self._pending_dict = {}
+        # whether any pending tensor is still being copied from a CUDA device
+        self._pending_cuda = False
 
     def __getitem__(self, name: str):
+        self._flush()
         return self._data_dict[name]
 
     def __setitem__(self, name: str, value):
+        self._pending_dict.pop(name, None)
         self._data_dict[name] = value
 
     def __delitem__(self, name: str):
-        self._data_dict.pop(name)
+        if name not in self:
+            raise KeyError(name)
+        self._pending_dict.pop(name, None)
+        self._data_dict.pop(name, None)
 
     def __contains__(self, key: str):
-        return key in self._data_dict
+        return key in self._data_dict or key in self._pending_dict
 
     def get(self, name: str):
-        if name not in self._data_dict:
+        if name not in self:
             raise IndexError("Can not load the data without registration !")
         return self[name]
 
     def set(self, name: str, value):
-        self._data_dict[name] = value
+        self[name] = value
 
     def update_tensor(self, name: str, value: torch.Tensor):
-        if name not in self._data_dict:
-            self._data_dict[name] = value.cpu().clone().detach()
+        if name in self._data_dict and not isinstance(self._data_dict[name], torch.Tensor):
+            raise ValueError("{} is not a tensor.".format(name))
+        if value.is_cuda:
+            # the copy to host does not block the next batch, the device is synchronized once in _flush()
+            value = value.detach().to('cpu', non_blocking=True)
+            self._pending_cuda = True
         else:
-            if not isinstance(self._data_dict[name], torch.Tensor):
-                raise ValueError("{} is not a tensor.".format(name))
-            self._data_dict[name] = torch.cat((self._data_dict[name], value.cpu().clone().detach()), dim=0)
+            value = value.detach().clone()
+        self._pending_dict.setdefault(name, []).append(value)
+
+    def _flush(self):
+        if not self._pending_dict:
+            return
+        if self._pending_cuda:
+            torch.cuda.synchronize()
+            self._pending_cuda = False
+        for name, values in self._pending_dict.items():
+            if name in self._data_dict:
+                values = [self._data_dict[name]] + values
+            self._data_dict[name] = torch.cat(values, dim=0)
+        self._pending_dict.clear()
 
     def __str__(self):
+        self._flush()
         data_info = '\nContaining:\n'
         for data_key in self._data_dict.keys():
             data_info += data_key + '\n'
@@ -229,6 +254,7 @@ class Collector(object):
         """ Get all the evaluation resource that been collected.
             And reset some of outdated resource.
         """
+        self.data_struct._flush()
         returned_struct = copy.deepcopy(self.data_struct)
         for key in ['rec.topk', 'rec.meanrank', 'rec.score', 'rec.items', 'data.label', 'rec.positive_score',
                     'data.positive_i', 'rec.negative_score', 'data.negative_i']:
@@ -143,8 +143,12 @@ class PFCN_PMF(FairRecommender):
         item_embed = None
         if item is not None:
             item_embed = self.item_embedding_layer(item)
+        return self.filter_user_embed(user_embed, sst_list), item_embed
+
+    def filter_user_embed(self, user_embed, sst_list=None):
+        r"""Filter the information of sensitive attributes in ``sst_list`` out of the user embeddings."""
         if self.filter_mode == 'none':
-            return user_embed, item_embed
+            return user_embed
         elif self.filter_mode == 'sm':
             idx = 0
             for sst in sst_list:
@@ -160,7 +164,7 @@ class PFCN_PMF(FairRecommender):
 
             user_embed = user_temp / len(self.filter_layer)
 
-        return user_embed, item_embed
+        return user_embed
 
     def predict(self, interaction, sst_list=None):
         user = interaction[self.USER_ID]
@@ -218,13 +222,22 @@ class PFCN_PMF(FairRecommender):
         return self.sigmoid(pred_scores.view(-1))
 
     def get_sst_embed(self, user_data, sst_list=None):
-        ret_dict = {}
-        user_indices = torch.arange(1,self.n_users)
         sst_list = self.sst_attrs if self.filter_mode == 'none' else sst_list
-        for sst in sst_list:
-            ret_dict[sst] = user_data[sst][user_indices-1]
-        user_embeddings, _ = self.forward(user_indices.to(self.device),None,sst_list)
-        ret_dict['embedding'] = user_embeddings
+        return self.get_sst_embeds(user_data, [sst_list])[0]
+
+    def get_sst_embeds(self, user_data, sst_lists):
+        r"""Same as :meth:`get_sst_embed`, but for several combinations of sensitive attributes.
+        The embeddings of all the users are only computed once, and filtered by each combination.
+        """
+        user_indices = torch.arange(1,self.n_users)
+        user_embed = self.user_embedding_layer(user_indices.to(self.device))
+        ret_dicts = []
+        for sst_list in sst_lists:
+            ret_dict = {}
+            for sst in sst_list:
+                ret_dict[sst] = user_data[sst][user_indices-1]
+            ret_dict['embedding'] = self.filter_user_embed(user_embed, sst_list)
+            ret_dicts.append(ret_dict)
 
-        return ret_dict
+        return ret_dicts
 
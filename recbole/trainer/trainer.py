@@ -17,14 +17,21 @@ recbole.trainer.trainer
 ################################
 """
 from distutils.command.config import config
+import contextlib
+import copy
+import inspect
 import itertools
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from logging import getLogger
 from time import time
 
 import numpy as np
 import torch
+import torch.nn as nn
 import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
 from torch.nn.utils.clip_grad import clip_grad_norm_
 from tqdm import tqdm
 
@@ -34,6 +41,42 @@ from recbole.evaluator import Evaluator, Collector
 from recbole.utils import ensure_dir, get_local_time, early_stopping, calculate_valid_score, dict2str, \
     EvaluatorType, KGDataLoaderState, get_tensorboard, set_color, get_gpu_usage, WandbLogger
 
+# inference mode also skips the version counter and view tracking of autograd, it is only available since PyTorch 1.9
+inference_mode = torch.inference_mode if hasattr(torch, 'inference_mode') else torch.no_grad
+# mmap of torch.load is only available since PyTorch 2.1, and weights_only since PyTorch 1.13
+torch_load_params = inspect.signature(torch.load).parameters
+# torch.amp.GradScaler takes the device type since PyTorch 2.3, torch.cuda.amp.GradScaler is used before
+if hasattr(getattr(torch, 'amp', None), 'GradScaler'):
+    cuda_grad_scaler = partial(torch.amp.GradScaler, 'cuda')
+else:
+    cuda_grad_scaler = torch.cuda.amp.GradScaler
+# the fused Adam is only available since PyTorch 1.13
+adam_params = inspect.signature(optim.Adam).parameters
+# the parameters which are not decayed by weight_decay in _get_param_groups
+no_decay_norm_types = (nn.modules.batchnorm._NormBase, nn.LayerNorm, nn.GroupNorm)
+no_decay_bias_types = (nn.Linear, nn.modules.conv._ConvNd)
+
+
+def load_checkpoint(checkpoint_file, mmap=False):
+    r"""Read a checkpoint file to cpu, ``load_state_dict()`` then copies the parameters to the device of the model.
+
+    Args:
+        checkpoint_file (str): the checkpoint file.
+        mmap (bool, optional): whether map the tensors from the file instead of reading them into memory.
+            It should only be used when all the tensors are copied after loading, since the file may be
+            overwritten by the next checkpoint. Defaults to ``False``.
+
+    Returns:
+        dict: the checkpoint.
+    """
+    kwargs = {'map_location': 'cpu'}
+    if mmap and 'mmap' in torch_load_params:
+        kwargs['mmap'] = True
+    if 'weights_only' in torch_load_params:
+        # the checkpoints also pickle the config, which can not be loaded with weights only
+        kwargs['weights_only'] = False
+    return torch.load(checkpoint_file, **kwargs)
+
 
 class AbstractTrainer(object):
     r"""Trainer Class is used to manage the training and evaluation processes of recommender system models.
@@ -86,9 +129,11 @@ class Trainer(AbstractTrainer):
         self.eval_step = min(config['eval_step'], self.epochs)
         self.stopping_step = config['stopping_step']
         self.clip_grad_norm = config['clip_grad_norm']
+        self.gradient_accumulation_steps = config['gradient_accumulation_steps'] or 1
         self.valid_metric = config['valid_metric'].lower()
         self.valid_metric_bigger = config['valid_metric_bigger']
         self.test_batch_size = config['eval_batch_size']
+        self.progress_refresh_step = 32
         self.gpu_available = torch.cuda.is_available() and config['use_gpu']
         self.device = config['device']
         self.checkpoint_dir = config['checkpoint_dir']
@@ -96,6 +141,10 @@ class Trainer(AbstractTrainer):
         saved_model_file = '{}-{}.pth'.format(self.config['model'], get_local_time())
         self.saved_model_file = os.path.join(self.checkpoint_dir, saved_model_file)
         self.weight_decay = config['weight_decay']
+        if self.gpu_available:
+            self._set_cuda_backends(config['cudnn_benchmark'], config['tf32'])
+        self.amp_dtype = self._get_amp_dtype(config['amp_dtype'])
+        self.scaler = cuda_grad_scaler(enabled=self.amp_dtype == torch.float16)
 
         self.start_epoch = 0
         self.cur_step = 0
@@ -104,19 +153,110 @@ class Trainer(AbstractTrainer):
         self.train_loss_dict = dict()
 
         self.optimizer = self._build_optimizer()
+        # checkpoints are written by a background thread, one at a time, which is started by the first one
+        self._save_executor = None
+        self._save_future = None
+        # the parameters of the last checkpoint written to each file
+        self._saved_models = dict()
+        # the cpu copies of the last checkpoint written to each file, which are reused by the next one
+        self._snapshots = dict()
+        if config['compile_model']:
+            self._compile_model(config['compile_mode'] or 'default')
 
         self.eval_type = config['eval_type']
         self.eval_collector = Collector(config)
         self.evaluator = Evaluator(config)
         self.item_tensor = None
+        self._item_tensors = dict()
         self.tot_item_num = None
+        self._scores_buf = None
+        self._item_tiles = None
+
+    def _set_cuda_backends(self, cudnn_benchmark, tf32):
+        r"""Set the flags of CUDA backends which trade reproducibility for speed.
+
+        Args:
+            cudnn_benchmark (bool): Whether cuDNN benchmarks the algorithms of each input shape and picks the fastest
+                one. ``None`` keeps the setting of ``reproducibility``.
+            tf32 (bool): Whether matmuls and convolutions in fp32 use TF32 on the GPUs which support it.
+        """
+        if cudnn_benchmark is not None:
+            torch.backends.cudnn.benchmark = cudnn_benchmark
+            if cudnn_benchmark:
+                torch.backends.cudnn.deterministic = False
+        if tf32:
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.set_float32_matmul_precision('high')
+
+    def _get_amp_dtype(self, amp_dtype):
+        r"""Get the dtype of mixed precision training and evaluation.
+
+        Args:
+            amp_dtype (str): The name of dtype, range in ``['auto', 'bf16', 'fp16', 'off']``. ``'auto'`` uses bf16 on
+                the GPUs which support it, and fp16 otherwise.
+
+        Returns:
+            torch.dtype: ``torch.bfloat16``, ``torch.float16``, or ``None`` if mixed precision is not used.
+        """
+        amp_dtype = str(amp_dtype or 'off').lower()
+        if amp_dtype == 'off':
+            return None
+        if amp_dtype not in ['auto', 'bf16', 'fp16']:
+            self.logger.warning(f'Received unrecognized amp_dtype [{amp_dtype}], mixed precision is not used.')
+            return None
+        if not self.gpu_available:
+            self.logger.warning('Mixed precision is only used on GPU, [amp_dtype] is ignored.')
+            return None
+        if not hasattr(torch, 'autocast'):
+            self.logger.warning('Mixed precision requires PyTorch 1.10 or later, [amp_dtype] is ignored.')
+            return None
+        if amp_dtype != 'fp16' and not torch.cuda.is_bf16_supported():
+            if amp_dtype == 'bf16':
+                self.logger.warning('bf16 is not supported by the GPU, fp16 is used instead.')
+            return torch.float16
+        # bf16 has the same range as fp32, so the loss needs no scaling
+        return torch.float16 if amp_dtype == 'fp16' else torch.bfloat16
+
+    def _autocast(self):
+        r"""Get the autocast context of the model computation, which is disabled if :attr:`amp_dtype` is ``None``.
+        """
+        if self.amp_dtype is None:
+            # torch.autocast is only available since PyTorch 1.10, and mixed precision is never used without it
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.amp_dtype)
+
+    def _compile_model(self, mode):
+        r"""Replace the loss and prediction functions of :attr:`model` with their ``torch.compile`` versions.
+
+        The functions are compiled in place of wrapping the whole module, so the keys of ``state_dict()`` and the
+        saved checkpoints stay the same. It is done once here, and the compiled functions are reused by every epoch.
+        The loss functions of the fair models are recompiled once for each list of sensitive attributes they are
+        called with, as the list is a constant of the compiled graph.
+
+        Args:
+            mode (str): The compile mode, such as ``'default'`` or ``'reduce-overhead'``.
+        """
+        if not hasattr(torch, 'compile'):
+            self.logger.warning('torch.compile requires PyTorch 2.0 or later, [compile_model] is ignored.')
+            return
+        for func_name in ['calculate_loss', 'calculate_dis_loss', 'predict', 'full_sort_predict']:
+            # the discriminator loss is only defined by the fair models which train a filter adversarially
+            func = getattr(self.model, func_name, None)
+            if func is None:
+                continue
+            # the size of the evaluation batches, and of the training batches of the models which group them by user
+            # such as FOCF, follows the number of interactions of their users. so both the loss and the prediction
+            # functions are recompiled with dynamic shapes once the size changes, instead of once for every size
+            setattr(self.model, func_name, torch.compile(func, mode=mode, dynamic=None))
+        self.logger.info(f'Model compiled with mode [{mode}], the first epoch includes the compile time.')
 
     def _build_optimizer(self, **kwargs):
         r"""Init the Optimizer
 
         Args:
-            params (torch.nn.Parameter, optional): The parameters to be optimized.
-                Defaults to ``self.model.parameters()``.
+            params (iterable of torch.nn.Parameter or list of dict, optional): The parameters or parameter groups to be
+                optimized. Defaults to the groups given by :meth:`_get_param_groups`.
             learner (str, optional): The name of used optimizer. Defaults to ``self.learner``.
             learning_rate (float, optional): Learning rate. Defaults to ``self.learning_rate``.
             weight_decay (float, optional): The L2 regularization weight. Defaults to ``self.weight_decay``.
@@ -124,10 +264,12 @@ class Trainer(AbstractTrainer):
         Returns:
             torch.optim: the optimizer
         """
-        params = kwargs.pop('params', self.model.parameters())
         learner = kwargs.pop('learner', self.learner)
         learning_rate = kwargs.pop('learning_rate', self.learning_rate)
         weight_decay = kwargs.pop('weight_decay', self.weight_decay)
+        params = kwargs.pop('params', None)
+        if params is None:
+            params = self._get_param_groups(weight_decay)
 
         if self.config['reg_weight'] and weight_decay and weight_decay * self.config['reg_weight'] > 0:
             self.logger.warning(
@@ -136,7 +278,11 @@ class Trainer(AbstractTrainer):
             )
 
         if learner.lower() == 'adam':
-            optimizer = optim.Adam(params, lr=learning_rate, weight_decay=weight_decay)
+            adam_kwargs = {}
+            if 'fused' in adam_params:
+                # the fused implementation updates all the parameters of a device in a single kernel
+                adam_kwargs['fused'] = self.gpu_available
+            optimizer = optim.Adam(params, lr=learning_rate, weight_decay=weight_decay, **adam_kwargs)
         elif learner.lower() == 'sgd':
             optimizer = optim.SGD(params, lr=learning_rate, weight_decay=weight_decay)
         elif learner.lower() == 'adagrad':
@@ -150,8 +296,41 @@ class Trainer(AbstractTrainer):
         else:
             self.logger.warning('Received unrecognized optimizer, set default Adam optimizer')
             optimizer = optim.Adam(params, lr=learning_rate)
+        if self.config['compile_model'] and hasattr(torch, 'compile') and not optimizer.defaults.get('fused'):
+            # the per-parameter updates are fused into a few kernels, which the fused optimizers already do
+            optimizer.step = torch.compile(optimizer.step, fullgraph=False)
         return optimizer
 
+    def _get_param_groups(self, weight_decay):
+        r"""Get the parameters of :attr:`model` to be optimized. If ``weight_decay`` is used, the biases of linear and
+        convolution layers and the parameters of normalization layers are put into a separate group without weight
+        decay. They are picked by the type of their layer, since the layers in ``nn.Sequential`` are named by index.
+
+        Args:
+            weight_decay (float): The L2 regularization weight.
+
+        Returns:
+            iterable or list of dict: The parameters, or the parameter groups.
+        """
+        if not weight_decay:
+            return self.model.parameters()
+        decay_params, no_decay_params = [], []
+        seen_params = set()
+        for module in self.model.modules():
+            for name, param in module.named_parameters(recurse=False):
+                if id(param) in seen_params:
+                    continue
+                seen_params.add(id(param))
+                # only the biases of linear and convolution layers and the affine parameters of normalization layers,
+                # the bias embeddings of the models such as BiasedMF are still regularized
+                is_bias = name == 'bias' and isinstance(module, no_decay_bias_types)
+                if is_bias or isinstance(module, no_decay_norm_types):
+                    no_decay_params.append(param)
+                else:
+                    decay_params.append(param)
+        param_groups = [{'params': decay_params}, {'params': no_decay_params, 'weight_decay': 0.0}]
+        return [group for group in param_groups if group['params']]
+
     def _train_epoch(self, train_data, epoch_idx, loss_func=None, show_progress=False):
         r"""Train the model in an epoch
 
@@ -178,31 +357,127 @@ class Trainer(AbstractTrainer):
                 desc=set_color(f"Train {epoch_idx:>5}", 'pink'),
             ) if show_progress else train_data
         )
+        accumulation_steps = self.gradient_accumulation_steps
+        accumulate_loss = None
+        self.optimizer.zero_grad(set_to_none=True)
         for batch_idx, interaction in enumerate(iter_data):
-            interaction = interaction.to(self.device)
-            self.optimizer.zero_grad()
-            losses = loss_func(interaction)
-            if isinstance(losses, tuple):
-                loss = sum(losses)
-                loss_tuple = tuple(per_loss.item() for per_loss in losses)
-                total_loss = loss_tuple if total_loss is None else tuple(map(sum, zip(total_loss, loss_tuple)))
-            else:
-                loss = losses
-                total_loss = losses.item() if total_loss is None else total_loss + losses.item()
-            self._check_nan(loss)
-            loss.backward()
+            interaction = interaction.to(self.device, non_blocking=True)
+            # the optimizer steps every `accumulation_steps` batches, and at the end of the epoch
+            sync_step = (batch_idx + 1) % accumulation_steps == 0 or batch_idx + 1 == len(train_data)
+            with self._no_sync(sync_step):
+                with self._autocast():
+                    losses = loss_func(interaction)
+                if accumulate_loss is None:
+                    # whether the loss function returns a tuple is fixed, so it is only checked on the first batch
+                    accumulate_loss, total_loss = self._get_loss_accumulator(losses)
+                loss, total_loss = accumulate_loss(losses, total_loss)
+                self._check_total_nan(batch_idx, total_loss)
+                if accumulation_steps > 1:
+                    loss = loss / accumulation_steps
+                self.scaler.scale(loss).backward()
+            if not sync_step:
+                continue
             if self.clip_grad_norm:
+                self.scaler.unscale_(self.optimizer)
                 clip_grad_norm_(self.model.parameters(), **self.clip_grad_norm)
-            self.optimizer.step()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+            self.optimizer.zero_grad(set_to_none=True)
             if self.gpu_available and show_progress:
-                iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))            
-        
+                self._set_gpu_usage_postfix(iter_data, batch_idx)
+
+        total_loss = self._sync_total_loss(total_loss)
+
         if self.config['ips_norm']:
             with torch.no_grad():
                 self.model.ips_norm()
         
         return total_loss
 
+    def _sync_total_loss(self, total_loss):
+        r"""Copy the total loss of an epoch back from the device, in a single synchronization.
+
+        Args:
+            total_loss (torch.Tensor): The total loss summed on the device, ``None`` if the epoch is empty.
+
+        Returns:
+            float/tuple: The total loss.
+        """
+        if total_loss is None:
+            return None
+        # a nan loss in any batch makes the sum nan as well
+        if total_loss.dim() > 0:
+            self._check_nan(total_loss.sum())
+            return tuple(total_loss.tolist())
+        self._check_nan(total_loss)
+        return total_loss.item()
+
+    def _check_total_nan(self, batch_idx, total_loss):
+        r"""Check the total loss of the epoch for nan every :attr:`progress_refresh_step` batches. A nan loss in any
+        batch makes the sum nan as well, so it is caught within a few optimizer steps, without a synchronization on
+        every batch.
+
+        Args:
+            batch_idx (int): The index of the current batch.
+            total_loss (torch.Tensor): The total loss of the batches so far, summed on the device.
+        """
+        if (batch_idx + 1) % self.progress_refresh_step == 0:
+            self._check_nan(total_loss.sum())
+
+    def _get_loss_accumulator(self, losses):
+        r"""Get the function which adds the loss of a batch to the total loss of the epoch, and the initial total loss.
+
+        Args:
+            losses (torch.Tensor or tuple): The loss of the first batch.
+
+        Returns:
+            tuple: The accumulate function, and the initial total loss.
+        """
+        if isinstance(losses, tuple):
+            # the parts of loss are summed into a single preallocated tensor, which is updated in place
+            return self._accumulate_tuple_loss, torch.zeros(len(losses), device=self.device)
+        return self._accumulate_loss, 0
+
+    @staticmethod
+    def _accumulate_loss(losses, total_loss):
+        r"""Add the loss of a batch to the total loss of the epoch. The sum is kept on the device, and only copied
+        back once at the end of the epoch.
+
+        Args:
+            losses (torch.Tensor): The loss of a batch.
+            total_loss (torch.Tensor or int): The total loss of the previous batches.
+
+        Returns:
+            tuple: The loss to be backpropagated, and the new total loss.
+        """
+        # the loss may also be returned with shape (1, ), which would make the total loss a tuple of one part
+        return losses, total_loss + losses.detach().reshape(())
+
+    @staticmethod
+    def _accumulate_tuple_loss(losses, total_loss):
+        r"""Same as :meth:`_accumulate_loss`, but for the loss function which returns multiple parts of loss.
+        """
+        total_loss += torch.stack([loss.detach().reshape(()) for loss in losses])
+        return sum(losses), total_loss
+
+    def _no_sync(self, sync_step):
+        r"""Get the context of a training step, which skips the gradient all-reduce of ``DistributedDataParallel``
+        on the steps that only accumulate gradients.
+
+        Args:
+            sync_step (bool): Whether the optimizer steps after this batch.
+        """
+        if not sync_step and isinstance(self.model, DistributedDataParallel):
+            return self.model.no_sync()
+        return contextlib.nullcontext()
+
+    def _set_gpu_usage_postfix(self, iter_data, batch_idx):
+        r"""Show the GPU memory usage in the postfix of the progress bar. It is only updated every
+        :attr:`progress_refresh_step` batches, and drawn at the next refresh of the bar.
+        """
+        if batch_idx % self.progress_refresh_step == 0:
+            iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'), refresh=False)
+
     def _valid_epoch(self, valid_data, show_progress=False):
         r"""Valid the model with valid data
 
@@ -234,11 +509,133 @@ class Trainer(AbstractTrainer):
             'state_dict': self.model.state_dict(),
             'other_parameter': self.model.other_parameter(),
             'optimizer': self.optimizer.state_dict(),
+            'scaler': self.scaler.state_dict(),
         }
-        torch.save(state, saved_model_file)
+        self._write_checkpoint(state, saved_model_file)
         if verbose:
             self.logger.info(set_color('Saving current', 'blue') + f': {saved_model_file}')
 
+    def _write_checkpoint(self, state, saved_model_file):
+        r"""Write a checkpoint in the background by :meth:`_save_state_async`. The saved parameters are also kept in
+        memory, so they can be restored by :meth:`_load_saved_model` without reading the file back.
+
+        Args:
+            state (dict): the checkpoint, which includes ``state_dict`` and ``other_parameter``.
+            saved_model_file (str): the path of the checkpoint file.
+        """
+        state = self._save_state_async(state, saved_model_file)
+        self._saved_models[saved_model_file] = {
+            'state_dict': state['state_dict'],
+            'other_parameter': state['other_parameter'],
+        }
+
+    def _save_state_async(self, state, saved_model_file):
+        r"""Write a checkpoint in the background, so that training goes on while it is pickled and written.
+
+        The tensors of :attr:`state` are copied to cpu first, as the model and optimizer keep being updated in place.
+        The copies of each file are reused by its next checkpoint, and the copies from GPU go to pinned memory without
+        blocking, the background thread waits for them before writing.
+
+        Args:
+            state (dict): the checkpoint.
+            saved_model_file (str): the path of the checkpoint file.
+
+        Returns:
+            dict: the checkpoint being written, whose tensors are on cpu.
+        """
+        # the previous checkpoint may still be read from the copies which are overwritten here
+        self._wait_checkpoint()
+        if self._save_executor is None:
+            self._save_executor = ThreadPoolExecutor(max_workers=1)
+        state = self._snapshot(state, self._snapshots.get(saved_model_file))
+        self._snapshots[saved_model_file] = state
+        copied_event = None
+        if self.gpu_available:
+            copied_event = torch.cuda.Event()
+            copied_event.record()
+        self._save_future = self._save_executor.submit(self._save_state, state, saved_model_file, copied_event)
+        return state
+
+    @staticmethod
+    def _save_state(state, saved_model_file, copied_event=None):
+        if copied_event is not None:
+            copied_event.synchronize()
+        torch.save(state, saved_model_file)
+
+    def _snapshot(self, data, buffer=None):
+        r"""Copy all the tensors nested in dicts, lists and tuples of :attr:`data` to cpu.
+
+        Args:
+            data: the data to be copied.
+            buffer (optional): the previous copy of the data, whose tensors are overwritten if their shapes and dtypes
+                still match. Defaults to ``None``.
+
+        Returns:
+            the copy of the data.
+        """
+        if isinstance(data, torch.Tensor):
+            data = data.detach()
+            if not (isinstance(buffer, torch.Tensor) and buffer.shape == data.shape and buffer.dtype == data.dtype):
+                buffer = torch.empty_like(data, device='cpu', pin_memory=data.is_cuda)
+            return buffer.copy_(data, non_blocking=data.is_cuda)
+        if isinstance(data, dict):
+            buffer = buffer if isinstance(buffer, dict) else dict()
+            return {key: self._snapshot(value, buffer.get(key)) for key, value in data.items()}
+        if isinstance(data, (list, tuple)):
+            buffer = buffer if isinstance(buffer, (list, tuple)) and len(buffer) == len(data) else [None] * len(data)
+            return type(data)(self._snapshot(value, value_buffer) for value, value_buffer in zip(data, buffer))
+        return data
+
+    def _wait_checkpoint(self):
+        r"""Wait until the checkpoint being written in the background is finished, and raise its error if any."""
+        if self._save_future is not None:
+            future, self._save_future = self._save_future, None
+            future.result()
+
+    def close(self):
+        r"""Finish the checkpoint being written in the background, then stop its thread and free the cpu copies of the
+        checkpoints kept for the next ones, such as the optimizer states. The saved parameters stay in memory, so
+        :meth:`evaluate` still restores the best model without reading it back. The next checkpoint starts the thread
+        again.
+        """
+        self._wait_checkpoint()
+        if self._save_executor is not None:
+            self._save_executor.shutdown(wait=True)
+            self._save_executor = None
+        self._snapshots.clear()
+
+    def _load_saved_model(self, checkpoint_file, loaded_checkpoints=None):
+        r"""Load the model parameters from a checkpoint file, or from memory if this trainer has saved them to the file.
+
+        Args:
+            checkpoint_file (str): the checkpoint file.
+            loaded_checkpoints (dict, optional): the checkpoints already read by the caller, keyed by their files.
+                The checkpoint is only read if it is not in it, and then added to it. Defaults to ``None``.
+        """
+        checkpoint = self._saved_models.get(checkpoint_file)
+        if checkpoint is None and loaded_checkpoints is not None:
+            checkpoint = loaded_checkpoints.get(checkpoint_file)
+        if checkpoint is None:
+            checkpoint = self._load_checkpoint(checkpoint_file, mmap=True)
+            if loaded_checkpoints is not None:
+                loaded_checkpoints[checkpoint_file] = checkpoint
+        self.model.load_state_dict(checkpoint['state_dict'])
+        self.model.load_other_parameter(checkpoint.get('other_parameter'))
+
+    def _load_checkpoint(self, checkpoint_file, mmap=False):
+        r"""Read a checkpoint file by :func:`load_checkpoint`, after the checkpoint being written to it is finished.
+
+        Args:
+            checkpoint_file (str): the checkpoint file.
+            mmap (bool, optional): whether map the tensors from the file instead of reading them into memory.
+                Defaults to ``False``.
+
+        Returns:
+            dict: the checkpoint.
+        """
+        self._wait_checkpoint()
+        return load_checkpoint(checkpoint_file, mmap=mmap)
+
     def _save_sst_embed(self, data):
         r""" save sensitive attributes and user embeddings
 
@@ -246,15 +643,45 @@ class Trainer(AbstractTrainer):
             data(dataLoader): train data
 
         """
-        checkpoint_file = self.saved_model_file
-        checkpoint = torch.load(checkpoint_file)
-        self.model.load_state_dict(checkpoint['state_dict'])
-        self.model.load_other_parameter(checkpoint.get('other_parameter'))
+        self._load_saved_model(self.saved_model_file)
         self.model.eval()
         user_features = data.dataset.get_user_feature()
         stored_dict = self.model.get_sst_embed(user_features[1:])
         torch.save(stored_dict, self.saved_sst_embed_file)
 
+    def _load_optimizer_state(self, optimizer, state_dict):
+        r"""Load the state of an optimizer from a checkpoint whose parameter groups may differ from the current ones.
+
+        The checkpoints saved with another grouping of the same parameters keep them in the same order, so their
+        states are regrouped by the current groups, whose hyperparameters are kept. If the number of parameters differs
+        as well, the state is not loaded and the optimizer starts from scratch.
+
+        Args:
+            optimizer (torch.optim.Optimizer): The optimizer to be loaded.
+            state_dict (dict): The state of the optimizer in the checkpoint.
+        """
+        saved_groups = state_dict['param_groups']
+        if len(saved_groups) != len(optimizer.param_groups):
+            saved_ids = [param_id for group in saved_groups for param_id in group['params']]
+            current_groups = optimizer.state_dict()['param_groups']
+            if len(saved_ids) != sum(len(group['params']) for group in current_groups):
+                self.logger.warning(
+                    'The parameters of the optimizer in the checkpoint do not match the model, '
+                    'the optimizer state is not loaded.'
+                )
+                return
+            self.logger.warning(
+                f'The optimizer in the checkpoint has {len(saved_groups)} parameter groups instead of '
+                f'{len(current_groups)}, its state is regrouped with the current hyperparameters.'
+            )
+            start = 0
+            for group in current_groups:
+                end = start + len(group['params'])
+                group['params'] = saved_ids[start:end]
+                start = end
+            state_dict = {'state': state_dict['state'], 'param_groups': current_groups}
+        optimizer.load_state_dict(state_dict)
+
     def resume_checkpoint(self, resume_file):
         r"""Load the model parameters information and training information.
 
@@ -264,7 +691,8 @@ class Trainer(AbstractTrainer):
         """
         resume_file = str(resume_file)
         self.saved_model_file = resume_file
-        checkpoint = torch.load(resume_file)
+        # the optimizer state may keep the loaded tensors, so they are not mapped from the file
+        checkpoint = self._load_checkpoint(resume_file)
         self.start_epoch = checkpoint['epoch'] + 1
         self.cur_step = checkpoint['cur_step']
         self.best_valid_score = checkpoint['best_valid_score']
@@ -279,7 +707,10 @@ class Trainer(AbstractTrainer):
         self.model.load_other_parameter(checkpoint.get('other_parameter'))
 
         # load optimizer state from checkpoint only when optimizer type is not changed
-        self.optimizer.load_state_dict(checkpoint['optimizer'])
+        self._load_optimizer_state(self.optimizer, checkpoint['optimizer'])
+        # the scale of the loss is only saved by fp16 mixed precision training
+        if checkpoint.get('scaler'):
+            self.scaler.load_state_dict(checkpoint['scaler'])
         message_output = 'Checkpoint loaded. Resume training from epoch {}'.format(self.start_epoch)
         self.logger.info(message_output)
 
@@ -329,6 +760,91 @@ class Trainer(AbstractTrainer):
 
         self.tensorboard.add_hparams(hparam_dict, {'hparam/best_valid_result': best_valid_result})
 
+    def _run_epoch(
+        self, epoch_idx, train_data, valid_data, train_fn, save_fn, verbose=True, saved=True, show_progress=False,
+        callback_fn=None, stage='training', log_train_metrics=True, log_save_without_valid=True
+    ):
+        r"""Train the model for one epoch, and evaluate it on the valid data if it is an evaluation epoch.
+
+        Args:
+            epoch_idx (int): the current epoch id.
+            train_data (DataLoader): the train data.
+            valid_data (DataLoader): the valid data. If it's None, the early_stopping is invalid.
+            train_fn (callable): the function to train an epoch, with the same arguments as :meth:`_train_epoch`.
+            save_fn (callable): the function to save the model, with the same arguments as :meth:`_save_checkpoint`.
+            verbose (bool, optional): whether to write training and evaluation information to logger, default: True
+            saved (bool, optional): whether to save the model parameters, default: True
+            show_progress (bool): Show the progress of training epoch and evaluate epoch. Defaults to ``False``.
+            callback_fn (callable): Optional callback function executed at end of epoch.
+                                    Includes (epoch_idx, valid_score) input arguments.
+            stage (str, optional): the name of the stage in the log of early stopping. Defaults to ``'training'``.
+            log_train_metrics (bool, optional): whether to log the train loss to wandb. Defaults to ``True``.
+            log_save_without_valid (bool, optional): whether :attr:`save_fn` logs the checkpoints saved every epoch
+                when there is no valid data. Defaults to ``True``.
+
+        Returns:
+            bool: whether the training should be stopped early.
+        """
+        # train
+        training_start_time = time()
+        train_loss = train_fn(train_data, epoch_idx, show_progress=show_progress)
+        self.train_loss_dict[epoch_idx] = sum(train_loss) if isinstance(train_loss, tuple) else train_loss
+        training_end_time = time()
+        train_loss_output = \
+            self._generate_train_loss_output(epoch_idx, training_start_time, training_end_time, train_loss)
+        if verbose:
+            self.logger.info(train_loss_output)
+        self._add_train_loss_to_tensorboard(epoch_idx, train_loss)
+        if log_train_metrics:
+            self.wandblogger.log_metrics({'epoch': epoch_idx, 'train_loss': train_loss, 'train_step': epoch_idx},
+                                         head='train')
+
+        # eval
+        if self.eval_step <= 0 or not valid_data:
+            if saved:
+                save_fn(epoch_idx, verbose=verbose and log_save_without_valid)
+            return False
+        if (epoch_idx + 1) % self.eval_step != 0:
+            return False
+
+        valid_start_time = time()
+        valid_score, valid_result = self._valid_epoch(valid_data, show_progress=show_progress)
+        self.best_valid_score, self.cur_step, stop_flag, update_flag = early_stopping(
+            valid_score,
+            self.best_valid_score,
+            self.cur_step,
+            max_step=self.stopping_step,
+            bigger=self.valid_metric_bigger
+        )
+        valid_end_time = time()
+        valid_score_output = (set_color("epoch %d evaluating", 'green') + " [" + set_color("time", 'blue')
+                              + ": %.2fs, " + set_color("valid_score", 'blue') + ": %f]") % \
+                             (epoch_idx, valid_end_time - valid_start_time, valid_score)
+        valid_result_output = set_color('valid result', 'blue') + ': \n' + dict2str(valid_result)
+        if verbose:
+            self.logger.info(valid_score_output)
+            self.logger.info(valid_result_output)
+        self.tensorboard.add_scalar('Vaild_score', valid_score, epoch_idx)
+        self.wandblogger.log_metrics({**valid_result, 'valid_step': self.valid_step}, head='valid')
+
+        if update_flag:
+            if saved:
+                save_fn(epoch_idx, verbose=verbose)
+            self.best_valid_result = valid_result
+
+        if callback_fn:
+            callback_fn(epoch_idx, valid_score)
+
+        if stop_flag:
+            stop_output = 'Finished %s, best eval result in epoch %d' % \
+                          (stage, epoch_idx - self.cur_step * self.eval_step)
+            if verbose:
+                self.logger.info(stop_output)
+            return True
+
+        self.valid_step += 1
+        return False
+
     def fit(self, train_data, valid_data=None, verbose=True, saved=True, show_progress=False, callback_fn=None):
         r"""Train the model based on the train data and the valid data.
 
@@ -351,111 +867,129 @@ class Trainer(AbstractTrainer):
         self.eval_collector.data_collect(train_data)
         if self.config['train_neg_sample_args'].get('dynamic', 'none') != 'none':
             train_data.get_model(self.model)
-        valid_step = 0
+        self.valid_step = 0
 
         for epoch_idx in range(self.start_epoch, self.epochs):
-            # train
-            training_start_time = time()
-            train_loss = self._train_epoch(train_data, epoch_idx, show_progress=show_progress)
-            self.train_loss_dict[epoch_idx] = sum(train_loss) if isinstance(train_loss, tuple) else train_loss
-            training_end_time = time()
-            train_loss_output = \
-                self._generate_train_loss_output(epoch_idx, training_start_time, training_end_time, train_loss)
-            if verbose:
-                self.logger.info(train_loss_output)
-            self._add_train_loss_to_tensorboard(epoch_idx, train_loss)
-            self.wandblogger.log_metrics({'epoch': epoch_idx, 'train_loss': train_loss, 'train_step': epoch_idx},
-                                         head='train')
-
-            # eval
-            if self.eval_step <= 0 or not valid_data:
-                if saved:
-                    self._save_checkpoint(epoch_idx, verbose=verbose)
-                continue
-            if (epoch_idx + 1) % self.eval_step == 0:
-                valid_start_time = time()
-                valid_score, valid_result = self._valid_epoch(valid_data, show_progress=show_progress)
-                self.best_valid_score, self.cur_step, stop_flag, update_flag = early_stopping(
-                    valid_score,
-                    self.best_valid_score,
-                    self.cur_step,
-                    max_step=self.stopping_step,
-                    bigger=self.valid_metric_bigger
-                )
-                valid_end_time = time()
-                valid_score_output = (set_color("epoch %d evaluating", 'green') + " [" + set_color("time", 'blue')
-                                      + ": %.2fs, " + set_color("valid_score", 'blue') + ": %f]") % \
-                                     (epoch_idx, valid_end_time - valid_start_time, valid_score)
-                valid_result_output = set_color('valid result', 'blue') + ': \n' + dict2str(valid_result)
-                if verbose:
-                    self.logger.info(valid_score_output)
-                    self.logger.info(valid_result_output)
-                self.tensorboard.add_scalar('Vaild_score', valid_score, epoch_idx)
-                self.wandblogger.log_metrics({**valid_result, 'valid_step': valid_step}, head='valid')
-
-                if update_flag:
-                    if saved:
-                        self._save_checkpoint(epoch_idx, verbose=verbose)
-                    self.best_valid_result = valid_result
-
-                if callback_fn:
-                    callback_fn(epoch_idx, valid_score)
-
-                if stop_flag:
-                    stop_output = 'Finished training, best eval result in epoch %d' % \
-                                  (epoch_idx - self.cur_step * self.eval_step)
-                    if verbose:
-                        self.logger.info(stop_output)
-                    break
-
-                valid_step += 1
+            stop_flag = self._run_epoch(
+                epoch_idx, train_data, valid_data, self._train_epoch, self._save_checkpoint,
+                verbose=verbose, saved=saved, show_progress=show_progress, callback_fn=callback_fn
+            )
+            if stop_flag:
+                break
 
+        self._wait_checkpoint()
         # store embedding and sst if task need attacker after training
         if self.config['save_sst_embed']:
             self._save_sst_embed(train_data)
+        self.close()
 
         self._add_hparam_to_tensorboard(self.best_valid_score)
         return self.best_valid_score, self.best_valid_result
 
+    def _get_item_tensor(self, dataset):
+        r"""Get the item features of a dataset on device, which are only sent to device once.
+
+        The splits of a dataset share the same item features, so they also share the same tensors on device.
+
+        Args:
+            dataset (Dataset): The dataset of the eval data.
+
+        Returns:
+            Interaction: The item features on device.
+        """
+        source = dataset.item_feat if dataset.item_feat is not None else dataset
+        key = id(source)
+        # the source is kept together with the tensors, so that its id can not be reused by another object
+        if key not in self._item_tensors or self._item_tensors[key][0] is not source:
+            self._item_tensors[key] = (source, dataset.get_item_feature().to(self.device))
+        return self._item_tensors[key][1]
+
+    def _get_scores_buf(self, user_num):
+        r"""Get the first ``user_num`` rows of the scores buffer, which is reused by all the eval batches.
+
+        The collector has finished with the scores of a batch before the next batch is scored,
+        so the buffer is only reallocated when it is too small or the number of items changes.
+
+        Args:
+            user_num (int): The number of users in the batch.
+
+        Returns:
+            torch.Tensor: An uninitialized tensor with the shape of ``(user_num, tot_item_num)``.
+        """
+        if self._scores_buf is None or self._scores_buf.shape[0] < user_num \
+                or self._scores_buf.shape[1] != self.tot_item_num:
+            self._scores_buf = torch.empty((user_num, self.tot_item_num), device=self.device)
+        return self._scores_buf[:user_num]
+
+    def _get_item_tiles(self, user_num):
+        r"""Get :attr:`item_tensor` repeated ``user_num`` times, which is only built once for all the eval batches.
+        The tiles of fewer users are slices of it.
+
+        Args:
+            user_num (int): The number of users in a tile.
+
+        Returns:
+            Interaction: The item features repeated ``user_num`` times.
+        """
+        if self._item_tiles is None or self._item_tiles[0] is not self.item_tensor or self._item_tiles[1] != user_num:
+            self._item_tiles = (self.item_tensor, user_num, self.item_tensor.repeat(user_num))
+        return self._item_tiles[2]
+
     def _full_sort_batch_eval(self, batched_data):
         interaction, history_index, positive_u, positive_i = batched_data
         try:
             # Note: interaction without item ids
-            scores = self.model.full_sort_predict(interaction.to(self.device))
+            scores = self.model.full_sort_predict(interaction.to(self.device, non_blocking=True))
         except NotImplementedError:
+            # score a few users against all items at a time, instead of crossing the whole batch with all items
             inter_len = len(interaction)
-            new_inter = interaction.to(self.device).repeat_interleave(self.tot_item_num)
-            batch_size = len(new_inter)
-            new_inter.update(self.item_tensor.repeat(inter_len))
-            if batch_size <= self.test_batch_size:
-                scores = self.model.predict(new_inter)
-            else:
-                scores = self._spilt_predict(new_inter, batch_size)
-
-        scores = scores.view(-1, self.tot_item_num)
-        scores[:, 0] = -np.inf
+            user_inter = interaction.to(self.device, non_blocking=True)
+            user_step = max(self.test_batch_size // self.tot_item_num, 1)
+            item_tiles = self._get_item_tiles(user_step)
+            scores = self._get_scores_buf(inter_len)
+            for start in range(0, inter_len, user_step):
+                tile = user_inter[start:start + user_step]
+                user_num = len(tile)
+                tile = tile.repeat_interleave(self.tot_item_num)
+                batch_size = user_num * self.tot_item_num
+                tile.update(item_tiles if user_num == user_step else item_tiles[:batch_size])
+                if batch_size <= self.test_batch_size:
+                    tile_scores = self.model.predict(tile)
+                else:
+                    tile_scores = self._spilt_predict(tile, batch_size)
+                scores[start:start + user_num] = tile_scores.view(user_num, self.tot_item_num)
+
+        # scores of mixed precision are ranked in float32, as ties are far more frequent in half precision
+        scores = scores.view(-1, self.tot_item_num).float()
+        scores[:, 0].fill_(-np.inf)
         if history_index is not None:
-            scores[history_index] = -np.inf
+            # mask the history items through the flat index of (user, item), in a single kernel
+            history_u, history_i = history_index
+            history_flat = (history_u * self.tot_item_num + history_i).to(self.device, non_blocking=True)
+            scores.view(-1).index_fill_(0, history_flat, -np.inf)
         return interaction, scores, positive_u, positive_i
 
     def _neg_sample_batch_eval(self, batched_data):
         interaction, row_idx, positive_u, positive_i = batched_data
         batch_size = interaction.length
         if batch_size <= self.test_batch_size:
-            origin_scores = self.model.predict(interaction.to(self.device))
+            origin_scores = self.model.predict(interaction.to(self.device, non_blocking=True))
         else:
             origin_scores = self._spilt_predict(interaction, batch_size)
+        origin_scores = origin_scores.float()
 
         if self.config['eval_type'] == EvaluatorType.VALUE:
             return interaction, origin_scores, positive_u, positive_i
         elif self.config['eval_type'] == EvaluatorType.RANKING:
             col_idx = interaction[self.config['ITEM_ID_FIELD']]
-            batch_user_num = positive_u[-1] + 1
-            scores = torch.full((batch_user_num, self.tot_item_num), -np.inf, device=self.device)
-            scores[row_idx.long(), col_idx.long()] = origin_scores.view(-1)
+            batch_user_num = int(positive_u[-1]) + 1
+            scores = self._get_scores_buf(batch_user_num).fill_(-np.inf)
+            # write the scores through the flat index of (user, item), in a single kernel
+            flat_idx = (row_idx * self.tot_item_num + col_idx).to(self.device, non_blocking=True)
+            scores.view(-1).scatter_(0, flat_idx, origin_scores.view(-1))
             return interaction, scores, positive_u, positive_i
 
-    @torch.no_grad()
+    @inference_mode()
     def evaluate(self, eval_data, load_best_model=False, model_file=None, show_progress=False):
         r"""Evaluate the model based on the eval data.
 
@@ -475,9 +1009,7 @@ class Trainer(AbstractTrainer):
 
         if load_best_model:
             checkpoint_file = model_file or self.saved_model_file
-            checkpoint = torch.load(checkpoint_file)
-            self.model.load_state_dict(checkpoint['state_dict'])
-            self.model.load_other_parameter(checkpoint.get('other_parameter'))
+            self._load_saved_model(checkpoint_file)
             message_output = 'Loading model structure and parameters from {}'.format(checkpoint_file)
             self.logger.info(message_output)
 
@@ -485,8 +1017,7 @@ class Trainer(AbstractTrainer):
 
         if isinstance(eval_data, FullSortEvalDataLoader):
             eval_func = self._full_sort_batch_eval
-            if self.item_tensor is None:
-                self.item_tensor = eval_data.dataset.get_item_feature().to(self.device)
+            self.item_tensor = self._get_item_tensor(eval_data.dataset)
         else:
             eval_func = self._neg_sample_batch_eval
         if self.config['eval_type'] == EvaluatorType.RANKING:
@@ -503,32 +1034,65 @@ class Trainer(AbstractTrainer):
 
         self.eval_collector.model_collect(self.model)
         for batch_idx, batched_data in enumerate(iter_data):
-            torch.cuda.empty_cache() 
-            interaction, scores, positive_u, positive_i = eval_func(batched_data)
+            with self._autocast():
+                interaction, scores, positive_u, positive_i = eval_func(batched_data)
             if self.gpu_available and show_progress:
-                iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))
+                self._set_gpu_usage_postfix(iter_data, batch_idx)
             self.eval_collector.eval_batch_collect(scores, interaction, positive_u, positive_i)
+        if self.gpu_available and self.config['eval_empty_cache']:
+            torch.cuda.empty_cache()
         struct = self.eval_collector.get_data_struct()
         result = self.evaluator.evaluate(struct)
         self.wandblogger.log_eval_metrics(result, head='eval')
 
         return result
 
-    def _spilt_predict(self, interaction, batch_size):
-        spilt_interaction = dict()
-        for key, tensor in interaction.interaction.items():
-            spilt_interaction[key] = tensor.split(self.test_batch_size, dim=0)
-        num_block = (batch_size + self.test_batch_size - 1) // self.test_batch_size
-        result_list = []
-        for i in range(num_block):
-            current_interaction = dict()
-            for key, spilt_tensor in spilt_interaction.items():
-                current_interaction[key] = spilt_tensor[i]
-            result = self.model.predict(Interaction(current_interaction).to(self.device))
+    def _spilt_predict(self, interaction, batch_size, *predict_args):
+        # the whole batch is sent to device once, and every block is a view of it
+        interaction = interaction.to(self.device, non_blocking=True)
+        scores = None
+        for start in range(0, batch_size, self.test_batch_size):
+            result = self.model.predict(interaction[start:start + self.test_batch_size], *predict_args)
             if len(result.shape) == 0:
                 result = result.unsqueeze(0)
-            result_list.append(result)
-        return torch.cat(result_list, dim=0)
+            if scores is None:
+                # the scores of every block are written into one buffer, instead of being concatenated at the end
+                scores = result.new_empty((batch_size, ) + result.shape[1:])
+            scores[start:start + len(result)] = result
+        return scores
+
+
+class SSTSampler(object):
+    r"""Sample a non-empty subset of the sensitive attributes uniformly, which decides the filters trained in an epoch.
+
+    The bits of a random number in ``[1, 2 ** sst_num)`` are used as the mask, so a single draw is enough.
+    It is drawn on cpu from a generator of its own, which is seeded by ``seed`` once, so the masks do not depend on
+    the other random draws. The state of the generator is saved in checkpoints by :meth:`state_dict`.
+
+    Args:
+        sst_attr_list (list): The sensitive attributes.
+        seed (int): The seed of the generator.
+    """
+
+    def __init__(self, sst_attr_list, seed):
+        self.sst_num = len(sst_attr_list)
+        self.sst_values = np.array(list(sst_attr_list), dtype=object)
+        self.generator = torch.Generator().manual_seed(seed)
+
+    def sample(self):
+        r"""
+        Returns:
+            list: The sampled sensitive attributes.
+        """
+        code = torch.randint(1, 2 ** self.sst_num, (1, ), generator=self.generator).item()
+        mask = (code >> np.arange(self.sst_num)) & 1
+        return self.sst_values[mask.astype(bool)].tolist()
+
+    def state_dict(self):
+        return {'generator': self.generator.get_state()}
+
+    def load_state_dict(self, state_dict):
+        self.generator.set_state(state_dict['generator'])
 
 
 class FairGoTrainer(Trainer):
@@ -538,11 +1102,12 @@ class FairGoTrainer(Trainer):
         self.train_epoch_interval = config['train_epoch_interval']
         self.sst_num = len(self.config['sst_attr_list'])
         self.mask_label = {i:sst for i, sst in enumerate(self.config['sst_attr_list'])}
+        self.sst_sampler = SSTSampler(self.config['sst_attr_list'], config['seed'])
         self.load_pretrain_weight = config['load_pretrain_weight']
         if config['pretrain_model_file_path'] is not None:
             self.saved_pretrain_model_file = config['pretrain_model_file_path'] 
             checkpoint_file = config['pretrain_model_file_path']
-            checkpoint = torch.load(checkpoint_file)
+            checkpoint = self._load_checkpoint(checkpoint_file, mmap=True)
             self.model.load_state_dict(checkpoint['state_dict'])
             self.model.load_other_parameter(checkpoint.get('other_parameter'))
             message_output = 'Loading pretrain model structure and parameters from {}'.format(checkpoint_file)
@@ -601,7 +1166,12 @@ class FairGoTrainer(Trainer):
             'optimizer': self.optimizer.state_dict(),
             'other_parameter': self.model.other_parameter(),
         }
-        torch.save(state, saved_model_file)
+        self._write_checkpoint(state, saved_model_file)
+
+    def _save_pretrained_checkpoint(self, epoch, verbose=True):
+        if verbose:
+            self.logger.info(set_color('Saving current best', 'blue') + ': %s' % self.saved_pretrain_model_file)
+        self.save_pretrained_model(self.saved_pretrain_model_file)
 
     def pretrain(self, train_data, valid_data, verbose=True, saved=True, show_progress=False):
         self.saved_pretrain_model_file = os.path.join(
@@ -616,67 +1186,20 @@ class FairGoTrainer(Trainer):
         self.eval_step = min(self.config['eval_step'], self.pretrain_epochs)
         self.logger.info(set_color('Model Pretrain', 'yellow'))
         self.optimizer = self.optimizer_pretrain
-        valid_step = 0 
+        self.valid_step = 0
         self.eval_collector.data_collect(train_data)
+        train_fn = partial(self._train_epoch_with_mask, sst_list=None)
 
         for epoch_idx in range(self.start_epoch, self.pretrain_epochs):
-            # train
-            training_start_time = time()
-            train_loss = self._train_epoch_with_mask(train_data, epoch_idx, show_progress=show_progress, sst_list=None)
-            self.train_loss_dict[epoch_idx] = sum(train_loss) if isinstance(train_loss, tuple) else train_loss
-            training_end_time = time()
-            train_loss_output = \
-                self._generate_train_loss_output(epoch_idx, training_start_time, training_end_time, train_loss)
-            if verbose:
-                self.logger.info(train_loss_output)
-            self._add_train_loss_to_tensorboard(epoch_idx, train_loss)
+            stop_flag = self._run_epoch(
+                epoch_idx, train_data, valid_data, train_fn, self._save_pretrained_checkpoint,
+                verbose=verbose, saved=saved, show_progress=show_progress, stage='pretraining',
+                log_train_metrics=False, log_save_without_valid=False
+            )
+            if stop_flag:
+                break
 
-            # eval
-            if self.eval_step <= 0 or not valid_data:
-                if saved:
-                    self.save_pretrained_model(self.saved_pretrain_model_file)
-                continue
-            if (epoch_idx + 1) % self.eval_step == 0:
-                valid_start_time = time()
-                valid_score, valid_result = self._valid_epoch(valid_data, show_progress=show_progress)
-                self.best_valid_score, self.cur_step, stop_flag, update_flag = early_stopping(
-                    valid_score,
-                    self.best_valid_score,
-                    self.cur_step,
-                    max_step=self.stopping_step,
-                    bigger=self.valid_metric_bigger
-                )
-                valid_end_time = time()
-                valid_score_output = (set_color("epoch %d evaluating", 'green') + " [" + set_color("time", 'blue')
-                                      + ": %.2fs, " + set_color("valid_score", 'blue') + ": %f]") % \
-                                     (epoch_idx, valid_end_time - valid_start_time, valid_score)
-                valid_result_output = set_color('valid result', 'blue') + ': \n' + dict2str(valid_result)
-                if verbose:
-                    self.logger.info(valid_score_output)
-                    self.logger.info(valid_result_output)
-                self.tensorboard.add_scalar('Vaild_score', valid_score, epoch_idx)
-                self.wandblogger.log_metrics({**valid_result, 'valid_step': valid_step}, head='valid')
-
-                if update_flag:
-                    if saved:
-                        update_output = set_color('Saving current best', 'blue') + ': %s' % self.saved_pretrain_model_file
-                        if verbose:
-                            self.logger.info(update_output)
-                        self.save_pretrained_model(self.saved_pretrain_model_file)
-                    self.best_valid_result = valid_result
-
-                if stop_flag:
-                    stop_output = 'Finished pretraining, best eval result in epoch %d' % \
-                                  (epoch_idx - self.cur_step * self.eval_step)
-                    if verbose:
-                        self.logger.info(stop_output)
-                    break
-
-                valid_step += 1
-
-        checkpoint = torch.load(self.saved_pretrain_model_file)
-        self.model.load_state_dict(checkpoint['state_dict'])
-        self.model.load_other_parameter(checkpoint.get('other_parameter'))
+        self._load_saved_model(self.saved_pretrain_model_file)
         # store embedding and sst if task need attacker after training
         if self.config['save_sst_embed']:
             self._save_sst_embed(train_data, self.saved_pretrain_sst_file)
@@ -686,10 +1209,7 @@ class FairGoTrainer(Trainer):
 
     def _train_epoch(self, train_data, epoch_idx, loss_func=None, show_progress=False):
         dis_loss, filter_loss = 0., 0.
-        mask = np.zeros(self.sst_num)
-        while mask.sum() == 0:
-            mask = np.random.choice([0,1], self.sst_num)
-        sst_list = [sst for i, sst in self.mask_label.items() if mask[i]!=0]        
+        sst_list = self.sst_sampler.sample()
         if epoch_idx % self.train_epoch_interval == 0:
             self.optimizer = self.optimizer_filter
             self.logger.info('Train Filter')
@@ -715,27 +1235,39 @@ class FairGoTrainer(Trainer):
                 desc=set_color(f"Train {epoch_idx:>5}", 'pink'),
             ) if show_progress else train_data
         )
+        accumulation_steps = self.gradient_accumulation_steps
+        accumulate_loss = None
+        self.optimizer.zero_grad(set_to_none=True)
         for batch_idx, interaction in enumerate(iter_data):
-            interaction = interaction.to(self.device)
-            self.optimizer.zero_grad()
-            losses = loss_func(interaction, sst_list)
-            if isinstance(losses, tuple):
-                loss = sum(losses)
-                loss_tuple = tuple(per_loss.item() for per_loss in losses)
-                total_loss = loss_tuple if total_loss is None else tuple(map(sum, zip(total_loss, loss_tuple)))
-            else:
-                loss = losses
-                total_loss = losses.item() if total_loss is None else total_loss + losses.item()
-            self._check_nan(loss)
-            loss.backward()
+            interaction = interaction.to(self.device, non_blocking=True)
+            # the optimizer steps every `accumulation_steps` batches, and at the end of the epoch
+            sync_step = (batch_idx + 1) % accumulation_steps == 0 or batch_idx + 1 == len(train_data)
+            with self._no_sync(sync_step):
+                with self._autocast():
+                    losses = loss_func(interaction, sst_list)
+                # the batch is released before backward, tensors needed by backward are kept by autograd itself
+                del interaction
+                # losses are summed on the device, so the batches do not wait for the device to copy them back
+                if accumulate_loss is None:
+                    accumulate_loss, total_loss = self._get_loss_accumulator(losses)
+                loss, total_loss = accumulate_loss(losses, total_loss)
+                self._check_total_nan(batch_idx, total_loss)
+                if accumulation_steps > 1:
+                    loss = loss / accumulation_steps
+                self.scaler.scale(loss).backward()
+            if not sync_step:
+                continue
             if self.clip_grad_norm:
+                self.scaler.unscale_(self.optimizer)
                 clip_grad_norm_(self.model.parameters(), **self.clip_grad_norm)
-            self.optimizer.step()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+            self.optimizer.zero_grad(set_to_none=True)
             if self.gpu_available and show_progress:
-                iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))
-        return total_loss
+                self._set_gpu_usage_postfix(iter_data, batch_idx)
+        return self._sync_total_loss(total_loss)
 
-    @torch.no_grad()
+    @inference_mode()
     def evaluate(self, eval_data, load_best_model=True, model_file=None, show_progress=False):
         if not eval_data:
             return
@@ -745,11 +1277,11 @@ class FairGoTrainer(Trainer):
             result = super().evaluate(eval_data, show_progress=show_progress)
             return result
 
+        # the pretrain and finetune models may be saved to the same file, which is only read once
+        loaded_checkpoints = dict()
         if load_best_model and not self.load_pretrain_weight:
             checkpoint_file = self.saved_pretrain_model_file
-            checkpoint = torch.load(checkpoint_file)
-            self.model.load_state_dict(checkpoint['state_dict'])
-            self.model.load_other_parameter(checkpoint.get('other_parameter'))
+            self._load_saved_model(checkpoint_file, loaded_checkpoints)
             self.model.train_stage = 'pretrain'
             message_output = 'Loading pretrain model structure and parameters from {}'.format(checkpoint_file)
             self.logger.info(message_output)
@@ -759,9 +1291,7 @@ class FairGoTrainer(Trainer):
 
         if load_best_model:
             checkpoint_file = model_file or self.saved_model_file
-            checkpoint = torch.load(checkpoint_file)
-            self.model.load_state_dict(checkpoint['state_dict'])
-            self.model.load_other_parameter(checkpoint.get('other_parameter'))
+            self._load_saved_model(checkpoint_file, loaded_checkpoints)
             self.model.train_stage = 'finetune'
             message_output = 'Loading model structure and parameters from {}'.format(checkpoint_file)
             self.logger.info(message_output)
@@ -798,9 +1328,11 @@ class FairGoTrainer(Trainer):
             'other_parameter': self.model.other_parameter(),
             'optimizer': self.optimizer.state_dict(),
             'optimizer_filter': self.optimizer_filter.state_dict(),
-            'optimizer_dis': self.optimizer_dis.state_dict()
+            'optimizer_dis': self.optimizer_dis.state_dict(),
+            'scaler': self.scaler.state_dict(),
+            'sst_sampler': self.sst_sampler.state_dict(),
         }
-        torch.save(state, saved_model_file)
+        self._write_checkpoint(state, saved_model_file)
         if verbose:
             self.logger.info(set_color('Saving current', 'blue') + f': {saved_model_file}')
 
@@ -813,7 +1345,8 @@ class FairGoTrainer(Trainer):
         """
         resume_file = str(resume_file)
         self.saved_model_file = resume_file
-        checkpoint = torch.load(resume_file)
+        # the optimizer state may keep the loaded tensors, so they are not mapped from the file
+        checkpoint = self._load_checkpoint(resume_file)
         self.start_epoch = checkpoint['epoch'] + 1
         self.cur_step = checkpoint['cur_step']
         self.best_valid_score = checkpoint['best_valid_score']
@@ -828,8 +1361,14 @@ class FairGoTrainer(Trainer):
         self.model.load_other_parameter(checkpoint.get('other_parameter'))
 
         # load optimizer state from checkpoint only when optimizer type is not changed
-        self.optimizer_filter.load_state_dict(checkpoint['optimizer_filter'])
-        self.optimizer_dis.load_state_dict(checkpoint['optimizer_dis'])
+        self._load_optimizer_state(self.optimizer_filter, checkpoint['optimizer_filter'])
+        self._load_optimizer_state(self.optimizer_dis, checkpoint['optimizer_dis'])
+        # the scale of the loss is only saved by fp16 mixed precision training
+        if checkpoint.get('scaler'):
+            self.scaler.load_state_dict(checkpoint['scaler'])
+        # the masks go on from the resumed epoch, the checkpoints saved before the sampler keep the seeded state
+        if self.sst_sampler is not None and checkpoint.get('sst_sampler'):
+            self.sst_sampler.load_state_dict(checkpoint['sst_sampler'])
         message_output = 'Checkpoint loaded. Resume training from epoch {}'.format(self.start_epoch)
         self.logger.info(message_output)
 
@@ -868,18 +1407,42 @@ class PFCNTrainer(Trainer):
 
         self.filter_mode = config['filter_mode'].lower()
         self.train_epoch_interval = config['train_epoch_interval']
+        self.sst_sampler = None
         if self.filter_mode != 'none':
             self.sst_num = len(self.config['sst_attr_list'])
             self.mask_label = {i:sst for i, sst in enumerate(self.config['sst_attr_list'])}
+            self.sst_sampler = SSTSampler(self.config['sst_attr_list'], config['seed'])
+            # all the non-empty combinations of sensitive attributes, which are evaluated one by one
+            self._all_sst_lists = [
+                list(sst_list) for i in range(1, self.sst_num + 1)
+                for sst_list in itertools.combinations(self.config['sst_attr_list'], i)
+            ]
+
+    def _compile_model(self, mode):
+        r"""Compile the filter and discriminator layers one by one, in place of the loss and prediction functions.
+
+        The layers of each kind share one structure, so the code compiled for the first layer is reused by the others,
+        while the whole functions would be recompiled for every list of sensitive attributes they are called with.
+        The models without filter are compiled as in :meth:`Trainer._compile_model`.
+
+        Args:
+            mode (str): The compile mode, such as ``'default'`` or ``'reduce-overhead'``.
+        """
+        if getattr(self.model, 'filter_mode', 'none') == 'none' or not hasattr(torch, 'compile'):
+            super(PFCNTrainer, self)._compile_model(mode)
+            return
+        for layers in [self.model.filter_layer, self.model.dis_layer_dict]:
+            # the layers are kept in plain dicts, so the compiled ones can replace them without renaming any parameter
+            for key, layer in layers.items():
+                layers[key] = torch.compile(layer, mode=mode, fullgraph=True)
+        self.logger.info(f'Filter and discriminator layers compiled with mode [{mode}], '
+                         'the first epoch includes the compile time.')
 
     def _train_epoch(self, train_data, epoch_idx, loss_func=None, show_progress=False):
         dis_loss, filter_loss = 0., 0.
 
         if self.filter_mode != 'none':
-            mask = np.zeros(self.sst_num)
-            while mask.sum() == 0:
-                mask = np.random.choice([0,1], self.sst_num)
-            sst_list = [sst for i, sst in self.mask_label.items() if mask[i]!=0]
+            sst_list = self.sst_sampler.sample()
             if epoch_idx % self.config['train_epoch_interval'] == 0:
                 self.logger.info('Train Filter and Base model')
                 self.optimizer = self.optimizer_filter
@@ -909,60 +1472,61 @@ class PFCNTrainer(Trainer):
                 desc=set_color(f"Train {epoch_idx:>5}", 'pink'),
             ) if show_progress else train_data
         )
+        accumulation_steps = self.gradient_accumulation_steps
+        accumulate_loss = None
+        self.optimizer.zero_grad(set_to_none=True)
         for batch_idx, interaction in enumerate(iter_data):
-            interaction = interaction.to(self.device)
-            self.optimizer.zero_grad()
-            losses = loss_func(interaction, sst_list)
-            if isinstance(losses, tuple):
-                loss = sum(losses)
-                loss_tuple = tuple(per_loss.item() for per_loss in losses)
-                total_loss = loss_tuple if total_loss is None else tuple(map(sum, zip(total_loss, loss_tuple)))
-            else:
-                loss = losses
-                total_loss = losses.item() if total_loss is None else total_loss + losses.item()
-            self._check_nan(loss)
-            loss.backward()
+            interaction = interaction.to(self.device, non_blocking=True)
+            # the optimizer steps every `accumulation_steps` batches, and at the end of the epoch
+            sync_step = (batch_idx + 1) % accumulation_steps == 0 or batch_idx + 1 == len(train_data)
+            with self._no_sync(sync_step):
+                with self._autocast():
+                    losses = loss_func(interaction, sst_list)
+                # the batch is released before backward, tensors needed by backward are kept by autograd itself
+                del interaction
+                # losses are summed on the device, so the batches do not wait for the device to copy them back
+                if accumulate_loss is None:
+                    accumulate_loss, total_loss = self._get_loss_accumulator(losses)
+                loss, total_loss = accumulate_loss(losses, total_loss)
+                self._check_total_nan(batch_idx, total_loss)
+                if accumulation_steps > 1:
+                    loss = loss / accumulation_steps
+                self.scaler.scale(loss).backward()
+            if not sync_step:
+                continue
             if self.clip_grad_norm:
+                self.scaler.unscale_(self.optimizer)
                 clip_grad_norm_(self.model.parameters(), **self.clip_grad_norm)
-            self.optimizer.step()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+            self.optimizer.zero_grad(set_to_none=True)
             if self.gpu_available and show_progress:
-                iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))
-        return total_loss
+                self._set_gpu_usage_postfix(iter_data, batch_idx)
+        return self._sync_total_loss(total_loss)
 
     def _neg_sample_batch_eval(self, batched_data, sst_list=None):
         interaction, row_idx, positive_u, positive_i = batched_data
         batch_size = interaction.length
+        # the batch is not released after predict: its copy on device is a temporary of the call, or is shared by all
+        # the combinations of sensitive attributes in evaluate, and the collector still reads the labels from it
         if batch_size <= self.test_batch_size:
-            origin_scores = self.model.predict(interaction.to(self.device), sst_list)
+            origin_scores = self.model.predict(interaction.to(self.device, non_blocking=True), sst_list)
         else:
             origin_scores = self._spilt_predict(interaction, batch_size, sst_list)
 
         if self.config['eval_type'] == EvaluatorType.VALUE:
             return interaction, origin_scores, positive_u, positive_i
         elif self.config['eval_type'] == EvaluatorType.RANKING:
-            col_idx = interaction[self.config['ITEM_ID_FIELD']]
-            batch_user_num = positive_u[-1] + 1
-            scores = torch.full((batch_user_num, self.tot_item_num), -np.inf, device=self.device)
-            scores[row_idx.long(), col_idx.long()] = origin_scores.view(-1)
+            col_idx = interaction[self.config['ITEM_ID_FIELD']].to(self.device, non_blocking=True)
+            batch_user_num = int(positive_u[-1]) + 1
+            scores = self._get_scores_buf(batch_user_num).fill_(-np.inf)
+            # write the scores through the flat index of (user, item), in a single kernel. the row index is already
+            # on device if evaluate shares it between the combinations of sensitive attributes
+            flat_idx = row_idx.to(self.device, non_blocking=True) * self.tot_item_num + col_idx
+            scores.view(-1).scatter_(0, flat_idx, origin_scores.view(-1))
             return interaction, scores, positive_u, positive_i
 
-    def _spilt_predict(self, interaction, batch_size, sst_list):
-        spilt_interaction = dict()
-        for key, tensor in interaction.interaction.items():
-            spilt_interaction[key] = tensor.split(self.test_batch_size, dim=0)
-        num_block = (batch_size + self.test_batch_size - 1) // self.test_batch_size
-        result_list = []
-        for i in range(num_block):
-            current_interaction = dict()
-            for key, spilt_tensor in spilt_interaction.items():
-                current_interaction[key] = spilt_tensor[i]
-            result = self.model.predict(Interaction(current_interaction).to(self.device), sst_list)
-            if len(result.shape) == 0:
-                result = result.unsqueeze(0)
-            result_list.append(result)
-        return torch.cat(result_list, dim=0)
-
-    @torch.no_grad()
+    @inference_mode()
     def pfcn_evaluate(self, eval_data, load_best_model=True, model_file=None, show_progress=False):
         r"""Evaluate the model based on the eval data.
 
@@ -982,9 +1546,7 @@ class PFCNTrainer(Trainer):
 
         if load_best_model:
             checkpoint_file = model_file or self.saved_model_file
-            checkpoint = torch.load(checkpoint_file)
-            self.model.load_state_dict(checkpoint['state_dict'])
-            self.model.load_other_parameter(checkpoint.get('other_parameter'))
+            self._load_saved_model(checkpoint_file)
             message_output = 'Loading model structure and parameters from {}'.format(checkpoint_file)
             self.logger.info(message_output)
 
@@ -992,8 +1554,7 @@ class PFCNTrainer(Trainer):
 
         if isinstance(eval_data, FullSortEvalDataLoader):
             eval_func = self._full_sort_batch_eval
-            if self.item_tensor is None:
-                self.item_tensor = eval_data.dataset.get_item_feature().to(self.device)
+            self.item_tensor = self._get_item_tensor(eval_data.dataset)
         else:
             eval_func = self._neg_sample_batch_eval
         if self.config['eval_type'] == EvaluatorType.RANKING:
@@ -1009,17 +1570,17 @@ class PFCNTrainer(Trainer):
         )
         for batch_idx, batched_data in enumerate(iter_data):
             if self.filter_mode != 'none':
-                for i in range(1, self.sst_num+1):
-                    sst_lists = [list(_) for _ in itertools.combinations(self.config['sst_attr_list'], i)]
-                    for sst_list in sst_lists:
+                for sst_list in self._all_sst_lists:
+                    with self._autocast():
                         interaction, scores, positive_u, positive_i = eval_func(batched_data, sst_list)
-                        if self.gpu_available and show_progress:
-                            iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))
-                        self.eval_collector.eval_batch_collect(scores, interaction, positive_u, positive_i)
+                    if self.gpu_available and show_progress:
+                        self._set_gpu_usage_postfix(iter_data, batch_idx)
+                    self.eval_collector.eval_batch_collect(scores, interaction, positive_u, positive_i)
             else:
-                interaction, scores, positive_u, positive_i = eval_func(batched_data)
+                with self._autocast():
+                    interaction, scores, positive_u, positive_i = eval_func(batched_data)
                 if self.gpu_available and show_progress:
-                    iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))
+                    self._set_gpu_usage_postfix(iter_data, batch_idx)
                 self.eval_collector.eval_batch_collect(scores, interaction, positive_u, positive_i)
 
         self.eval_collector.model_collect(self.model)
@@ -1044,16 +1605,14 @@ class PFCNTrainer(Trainer):
         valid_score = calculate_valid_score(valid_result, self.valid_metric)
         return valid_score, valid_result
 
-    @torch.no_grad()
+    @inference_mode()
     def evaluate(self, eval_data, load_best_model=True, model_file=None, show_progress=False):
         if not eval_data:
             return
 
         if load_best_model:
             checkpoint_file = model_file or self.saved_model_file
-            checkpoint = torch.load(checkpoint_file)
-            self.model.load_state_dict(checkpoint['state_dict'])
-            self.model.load_other_parameter(checkpoint.get('other_parameter'))
+            self._load_saved_model(checkpoint_file)
             message_output = 'Loading model structure and parameters from {}'.format(checkpoint_file)
             self.logger.info(message_output)
 
@@ -1061,8 +1620,7 @@ class PFCNTrainer(Trainer):
 
         if isinstance(eval_data, FullSortEvalDataLoader):
             eval_func = self._full_sort_batch_eval
-            if self.item_tensor is None:
-                self.item_tensor = eval_data.dataset.get_item_feature().to(self.device)
+            self.item_tensor = self._get_item_tensor(eval_data.dataset)
         else:
             eval_func = self._neg_sample_batch_eval
         if self.config['eval_type'] == EvaluatorType.RANKING:
@@ -1078,24 +1636,34 @@ class PFCNTrainer(Trainer):
         )
         final_result = {}
         if self.filter_mode != 'none':
-            for i in range(1, self.sst_num+1):
-                sst_lists = [list(_) for _ in itertools.combinations(self.config['sst_attr_list'], i)]
-                for sst_list in sst_lists:
-                    for batch_idx, batched_data in enumerate(iter_data):
+            # the eval data is iterated only once, and each combination of sensitive attributes is collected apart
+            collectors = [self._copy_eval_collector() for _ in self._all_sst_lists]
+            for batch_idx, batched_data in enumerate(iter_data):
+                interaction, row_idx, *other_data = batched_data
+                # the batch is sent to device once, and shared by all the combinations, so is the row index of the
+                # scores given by the negative sampling eval data
+                interaction = interaction.to(self.device, non_blocking=True)
+                if eval_func == self._neg_sample_batch_eval:
+                    row_idx = row_idx.to(self.device, non_blocking=True)
+                batched_data = (interaction, row_idx, *other_data)
+                for sst_list, collector in zip(self._all_sst_lists, collectors):
+                    with self._autocast():
                         interaction, scores, positive_u, positive_i = eval_func(batched_data, sst_list)
-                        if self.gpu_available and show_progress:
-                            iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))
-                        self.eval_collector.eval_batch_collect(scores, interaction, positive_u, positive_i)
-                    self.eval_collector.model_collect(self.model)
-                    struct = self.eval_collector.get_data_struct()
-                    result = self.evaluator.evaluate(struct)
-                    final_result['{}-{}'.format(self.config['filter_mode'], sst_list)] = result
-                    self.wandblogger.log_eval_metrics(result, head='eval')
+                    collector.eval_batch_collect(scores, interaction, positive_u, positive_i)
+                if self.gpu_available and show_progress:
+                    self._set_gpu_usage_postfix(iter_data, batch_idx)
+            for sst_list, collector in zip(self._all_sst_lists, collectors):
+                collector.model_collect(self.model)
+                struct = collector.get_data_struct()
+                result = self.evaluator.evaluate(struct)
+                final_result['{}-{}'.format(self.config['filter_mode'], sst_list)] = result
+                self.wandblogger.log_eval_metrics(result, head='eval')
         else:
             for batch_idx, batched_data in enumerate(iter_data):
-                interaction, scores, positive_u, positive_i = eval_func(batched_data)
+                with self._autocast():
+                    interaction, scores, positive_u, positive_i = eval_func(batched_data)
                 if self.gpu_available and show_progress:
-                    iter_data.set_postfix_str(set_color('GPU RAM: ' + get_gpu_usage(self.device), 'yellow'))
+                    self._set_gpu_usage_postfix(iter_data, batch_idx)
                 self.eval_collector.eval_batch_collect(scores, interaction, positive_u, positive_i)
             self.eval_collector.model_collect(self.model)
             struct = self.eval_collector.get_data_struct()
@@ -1105,24 +1673,28 @@ class PFCNTrainer(Trainer):
 
         return final_result
 
+    def _copy_eval_collector(self):
+        r"""Get a new collector, which shares the resource collected from the training data with
+        :attr:`eval_collector`, but collects the eval batches on its own.
+        """
+        collector = copy.copy(self.eval_collector)
+        collector.data_struct = copy.deepcopy(self.eval_collector.data_struct)
+        return collector
+
     def _save_sst_embed(self, data):
-        checkpoint_file = self.saved_model_file
-        checkpoint = torch.load(checkpoint_file)
-        self.model.load_state_dict(checkpoint['state_dict'])
-        self.model.load_other_parameter(checkpoint.get('other_parameter'))
+        self._load_saved_model(self.saved_model_file)
         self.model.eval()
         user_features = data.dataset.get_user_feature()[1:]
 
         if self.filter_mode != 'none':
-            for i in range(1,4):
-                attr_lists = [list(_) for _ in itertools.combinations(self.config['sst_attr_list'],i)]
-                for attr_list in attr_lists:
-                    stored_dict = self.model.get_sst_embed(user_features, attr_list)
-                    saved_sst_embed_file = '{}_embed-{}-[{}].pth'.format(self.config['model'],
-                                                                         self.config['filter_mode'],
-                                                                         '_'.join(attr_list),)
-                    saved_sst_embed_file = os.path.join(self.checkpoint_dir, saved_sst_embed_file)
-                    torch.save(stored_dict, saved_sst_embed_file)
+            # the embeddings of users are computed once, and filtered by every combination of sensitive attributes
+            stored_dicts = self.model.get_sst_embeds(user_features, self._all_sst_lists)
+            for attr_list, stored_dict in zip(self._all_sst_lists, stored_dicts):
+                saved_sst_embed_file = '{}_embed-{}-[{}].pth'.format(self.config['model'],
+                                                                     self.config['filter_mode'],
+                                                                     '_'.join(attr_list),)
+                saved_sst_embed_file = os.path.join(self.checkpoint_dir, saved_sst_embed_file)
+                torch.save(stored_dict, saved_sst_embed_file)
         else:
             stored_dict = self.model.get_sst_embed(user_features)
             saved_sst_embed_file = '{}_embed-{}.pth'.format(self.config['model'],
@@ -1147,9 +1719,11 @@ class PFCNTrainer(Trainer):
             'other_parameter': self.model.other_parameter(),
             'optimizer': self.optimizer.state_dict(),
             'optimizer_filter': self.optimizer_filter.state_dict() if self.filter_mode !='none' else None,
-            'optimizer_dis': self.optimizer_dis.state_dict() if self.filter_mode !='none' else None
+            'optimizer_dis': self.optimizer_dis.state_dict() if self.filter_mode !='none' else None,
+            'scaler': self.scaler.state_dict(),
+            'sst_sampler': self.sst_sampler.state_dict() if self.sst_sampler is not None else None,
         }
-        torch.save(state, saved_model_file)
+        self._write_checkpoint(state, saved_model_file)
         if verbose:
             self.logger.info(set_color('Saving current', 'blue') + f': {saved_model_file}')
 
@@ -1162,7 +1736,8 @@ class PFCNTrainer(Trainer):
         """
         resume_file = str(resume_file)
         self.saved_model_file = resume_file
-        checkpoint = torch.load(resume_file)
+        # the optimizer state may keep the loaded tensors, so they are not mapped from the file
+        checkpoint = self._load_checkpoint(resume_file)
         self.start_epoch = checkpoint['epoch'] + 1
         self.cur_step = checkpoint['cur_step']
         self.best_valid_score = checkpoint['best_valid_score']
@@ -1177,11 +1752,17 @@ class PFCNTrainer(Trainer):
         self.model.load_other_parameter(checkpoint.get('other_parameter'))
 
         # load optimizer state from checkpoint only when optimizer type is not changed
-        if self.filter_mode != 'none':
-            self.optimizer.load_state_dict(checkpoint['optimizer'])
+        if self.filter_mode == 'none':
+            self._load_optimizer_state(self.optimizer, checkpoint['optimizer'])
         else:
-            self.optimizer_filter.load_state_dict(checkpoint['optimizer_filter'])
-            self.optimizer_dis.load_state_dict(checkpoint['optimizer_dis'])
+            self._load_optimizer_state(self.optimizer_filter, checkpoint['optimizer_filter'])
+            self._load_optimizer_state(self.optimizer_dis, checkpoint['optimizer_dis'])
+        # the scale of the loss is only saved by fp16 mixed precision training
+        if checkpoint.get('scaler'):
+            self.scaler.load_state_dict(checkpoint['scaler'])
+        # the masks go on from the resumed epoch, the checkpoints saved before the sampler keep the seeded state
+        if self.sst_sampler is not None and checkpoint.get('sst_sampler'):
+            self.sst_sampler.load_state_dict(checkpoint['sst_sampler'])
         message_output = 'Checkpoint loaded. Resume training from epoch {}'.format(self.start_epoch)
         self.logger.info(message_output)
 
@@ -1191,11 +1772,14 @@ class PFCN_MLPTrainer(PFCNTrainer):
         super(PFCN_MLPTrainer, self).__init__(config, model)
 
         if self.filter_mode != 'none':
-            self.optimizer_filter = self._build_optimizer(params=[{'params':self.model.user_embedding.weight}]
-                                                        + [{'params':self.model.item_embedding.weight}]
-                                                        + [{'params':_.parameters()} for _ in model.filter_layer.values()]
-                                                        + [{'params':model.mlp_layer.parameters()}])
-            self.optimizer_dis = self._build_optimizer(params=[{'params':_.parameters()} for _ in model.dis_layer_dict.values()])
+            # the parameters share the same hyperparameters, so they are updated as a single group
+            self.optimizer_filter = self._build_optimizer(params=list(itertools.chain(
+                [self.model.user_embedding.weight, self.model.item_embedding.weight],
+                *[layer.parameters() for layer in model.filter_layer.values()],
+                model.mlp_layer.parameters(),
+            )))
+            self.optimizer_dis = self._build_optimizer(
+                params=list(itertools.chain(*[layer.parameters() for layer in model.dis_layer_dict.values()])))
 
 
 class PFCN_BiasedMFTrainer(PFCNTrainer):
@@ -1203,13 +1787,14 @@ class PFCN_BiasedMFTrainer(PFCNTrainer):
         super(PFCN_BiasedMFTrainer, self).__init__(config, model)
 
         if self.filter_mode != 'none':
-            self.optimizer_filter = self._build_optimizer(params=[{'params':self.model.user_embedding_layer.weight}]
-                                                        + [{'params':self.model.item_embedding_layer.weight}]
-                                                        + [{'params':_.parameters()} for _ in model.filter_layer.values()]
-                                                        + [{'params':self.model.user_bias.weight}]
-                                                        + [{'params':self.model.item_bias.weight}]
-                                                        + [{'params':self.model.global_bias}])
-            self.optimizer_dis = self._build_optimizer(params=[{'params':_.parameters()} for _ in model.dis_layer_dict.values()])
+            # the parameters share the same hyperparameters, so they are updated as a single group
+            self.optimizer_filter = self._build_optimizer(params=list(itertools.chain(
+                [self.model.user_embedding_layer.weight, self.model.item_embedding_layer.weight],
+                *[layer.parameters() for layer in model.filter_layer.values()],
+                [self.model.user_bias.weight, self.model.item_bias.weight, self.model.global_bias],
+            )))
+            self.optimizer_dis = self._build_optimizer(
+                params=list(itertools.chain(*[layer.parameters() for layer in model.dis_layer_dict.values()])))
 
 
 class PFCN_DMFTrainer(PFCNTrainer):
@@ -1217,12 +1802,15 @@ class PFCN_DMFTrainer(PFCNTrainer):
         super(PFCN_DMFTrainer, self).__init__(config, model)
 
         if self.filter_mode != 'none':
-            self.optimizer_filter = self._build_optimizer(params=[{'params':self.model.user_embedding_layer.weight}]
-                                                        + [{'params':self.model.item_embedding_layer.weight}]
-                                                        + [{'params':_.parameters()} for _ in model.filter_layer.values()]
-                                                        + [{'params':self.model.user_mlp.parameters()}]
-                                                        + [{'params':self.model.item_mlp.parameters()}])
-            self.optimizer_dis = self._build_optimizer(params=[{'params':_.parameters()} for _ in model.dis_layer_dict.values()])
+            # the parameters share the same hyperparameters, so they are updated as a single group
+            self.optimizer_filter = self._build_optimizer(params=list(itertools.chain(
+                [self.model.user_embedding_layer.weight, self.model.item_embedding_layer.weight],
+                *[layer.parameters() for layer in model.filter_layer.values()],
+                self.model.user_mlp.parameters(),
+                self.model.item_mlp.parameters(),
+            )))
+            self.optimizer_dis = self._build_optimizer(
+                params=list(itertools.chain(*[layer.parameters() for layer in model.dis_layer_dict.values()])))
 
 
 class PFCN_PMFTrainer(PFCNTrainer):
@@ -1230,7 +1818,10 @@ class PFCN_PMFTrainer(PFCNTrainer):
         super(PFCN_PMFTrainer, self).__init__(config, model)
 
         if self.filter_mode != 'none':
-            self.optimizer_filter = self._build_optimizer(params=[{'params':self.model.user_embedding_layer.weight}]
-                                                        + [{'params':self.model.item_embedding_layer.weight}]
-                                                        + [{'params':_.parameters()} for _ in model.filter_layer.values()])
-            self.optimizer_dis = self._build_optimizer(params=[{'params':_.parameters()} for _ in model.dis_layer_dict.values()])
\ No newline at end of file
+            # the parameters share the same hyperparameters, so they are updated as a single group
+            self.optimizer_filter = self._build_optimizer(params=list(itertools.chain(
+                [self.model.user_embedding_layer.weight, self.model.item_embedding_layer.weight],
+                *[layer.parameters() for layer in model.filter_layer.values()],
+            )))
+            self.optimizer_dis = self._build_optimizer(
+                params=list(itertools.chain(*[layer.parameters() for layer in model.dis_layer_dict.values()])))
\ No newline at end of file
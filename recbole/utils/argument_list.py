@@ -17,6 +17,8 @@ general_arguments = [
     'dataset_save_path',
     'save_dataloaders',
     'dataloaders_save_path',
+    'pin_memory',
+    'cudnn_benchmark', 'tf32',
     'log_wandb',
 ]
 
@@ -25,15 +27,17 @@ training_arguments = [
     'learner', 'learning_rate',
     'neg_sampling',
     'eval_step', 'stopping_step',
-    'clip_grad_norm',
+    'clip_grad_norm', 'gradient_accumulation_steps',
     'weight_decay',
     'loss_decimal_place',
+    'compile_model', 'compile_mode',
+    'amp_dtype',
 ]
 
 evaluation_arguments = [
     'eval_args', 'repeatable',
     'metrics', 'topk', 'valid_metric', 'valid_metric_bigger',
-    'eval_batch_size',
+    'eval_batch_size', 'eval_empty_cache',
     'metric_decimal_place',
 ]
 
@@ -16,6 +16,8 @@ import os
 
 from recbole.config import Config
 from recbole.data import create_dataset, data_preparation, save_split_dataloaders, load_split_dataloaders
+from recbole.data.utils import valid_data_preparation
+from recbole.trainer.trainer import load_checkpoint
 from recbole.utils import init_logger, get_model, get_trainer, init_seed, logger, set_color
 
 
@@ -42,15 +44,13 @@ def run_recbole(model=None, dataset=None, config_file_list=None, config_dict=Non
         dataset_file=None,
         dataloader_file=None,
         config_file_list=config_file_list,
-        config_dict=config_dict
+        config_dict=config_dict,
+        eval_only=True
     )
-    # config = Config(model='UGF_MF', dataset='yahoo', config_file_list=['UGF_MF.yaml'])
-    # train_data, valid_data, test_data = data_preparation(config, dataset)
-
 
     init_seed(config['seed'], config['reproducibility'])
 
-    init_logger(config)
+    # the logger is initialized by load_data_and_model
     logger = getLogger()
 
     logger.info(config)
@@ -58,8 +58,8 @@ def run_recbole(model=None, dataset=None, config_file_list=None, config_dict=Non
     logger.info(model)
 
     # trainer loading and initialization
+    # the model already holds the saved parameters, and the optimizer state is not needed for evaluation
     trainer = get_trainer(config['MODEL_TYPE'], config['model'])(config, model)
-    trainer.resume_checkpoint(resume_file=model_file)
 
     # trainer._save_sst_embed(train_data)
 
@@ -68,9 +68,8 @@ def run_recbole(model=None, dataset=None, config_file_list=None, config_dict=Non
     #     train_data, valid_data, saved=saved, show_progress=config['show_progress']
     # )
 
-    # model evaluation
-    valid_result = trainer.evaluate(valid_data, load_best_model=saved, model_file=model_file, show_progress=config['show_progress'])
-    # best_valid_result = trainer.evaluate(test_data, load_best_model=saved, model_file=model_file, show_progress=config['show_progress'])
+    # model evaluation, the parameters of model_file are already loaded by load_data_and_model
+    valid_result = trainer.evaluate(valid_data, load_best_model=False, show_progress=config['show_progress'])
 
     logger.info(set_color('valid result', 'yellow') + f': {valid_result}')
     # logger.info(set_color('best valid ', 'yellow') + f': {best_valid_result}')
@@ -86,55 +85,86 @@ def run_recbole(model=None, dataset=None, config_file_list=None, config_dict=Non
     # }
 
 
-def load_data_and_model(model, dataset, model_file, dataset_file=None, dataloader_file=None, config_file_list=None, config_dict=None):
+def load_data_and_model(model, dataset, model_file, dataset_file=None, dataloader_file=None, config_file_list=None,
+                        config_dict=None, eval_only=False):
     r"""Load filtered dataset, split dataloaders and saved model.
 
     Args:
         model_file (str): The path of saved model file.
         dataset_file (str, optional): The path of filtered dataset. Defaults to ``None``.
         dataloader_file (str, optional): The path of split dataloaders. Defaults to ``None``.
+        config_dict (dict, optional): Parameters dictionary used to modify experiment parameters. If
+            :attr:`config_file_list` is ``None``, they override the parameters given to the config in
+            :attr:`model_file`. Defaults to ``None``.
+        eval_only (bool, optional): Whether only the validation dataloader is needed. If the dataloaders are
+            created, the training and test dataloaders are skipped and returned as ``None``, and none of them are
+            saved. Defaults to ``False``.
 
     Note:
         The :attr:`dataset` will be loaded or created according to the following strategy:
-        If :attr:`dataset_file` is not ``None``, the :attr:`dataset` will be loaded from :attr:`dataset_file`.
-        If :attr:`dataset_file` is ``None`` and :attr:`dataloader_file` is ``None``,
-        the :attr:`dataset` will be created according to :attr:`config`.
-        If :attr:`dataset_file` is ``None`` and :attr:`dataloader_file` is not ``None``,
-        the :attr:`dataset` will neither be loaded or created.
+        If the saved dataloaders are loaded, the :attr:`dataset` will neither be loaded or created.
+        Otherwise, if :attr:`dataset_file` is not ``None``, the :attr:`dataset` will be loaded from
+        :attr:`dataset_file`, and if :attr:`dataset_file` is ``None``, the :attr:`dataset` will be created
+        according to :attr:`config`.
 
         The :attr:`dataloader` will be loaded or created according to the following strategy:
         If :attr:`dataloader_file` is not ``None``, the :attr:`dataloader` will be loaded from :attr:`dataloader_file`.
-        If :attr:`dataloader_file` is ``None``, the :attr:`dataloader` will be created according to :attr:`config`.
+        If :attr:`dataloader_file` is ``None``, the :attr:`dataloader` will be loaded from
+        :attr:`config['dataloaders_save_path']` or the default path of :func:`save_split_dataloaders`.
+        In both cases, if the saved dataloaders do not exist or their dataset arguments differ from :attr:`config`,
+        the :attr:`dataloader` will be created according to :attr:`config`, and saved if
+        :attr:`config['save_dataloaders']` is ``True`` and :attr:`eval_only` is ``False``.
 
     Returns:
         tuple:
             - config (Config): An instance object of Config, which record parameter information in :attr:`model_file`.
             - model (AbstractRecommender): The model load from :attr:`model_file`.
             - dataset (Dataset): The filtered dataset.
-            - train_data (AbstractDataLoader): The dataloader for training.
+            - train_data (AbstractDataLoader): The dataloader for training, ``None`` if skipped by :attr:`eval_only`.
             - valid_data (AbstractDataLoader): The dataloader for validation.
-            - test_data (AbstractDataLoader): The dataloader for testing.
+            - test_data (AbstractDataLoader): The dataloader for testing, ``None`` if skipped by :attr:`eval_only`.
     """
-    checkpoint = torch.load(model_file)
+    # the tensors are mapped from the file, and only copied once when they are loaded into the model on its device.
+    # they are not mapped to the device directly, which would also allocate the optimizer states of the checkpoint and
+    # a second copy of the parameters there
+    checkpoint = load_checkpoint(model_file, mmap=True)
     if config_file_list is not None:
         config = Config(model=model, dataset=dataset, config_file_list=config_file_list, config_dict=config_dict)
     else:
         config = checkpoint['config']
+        if config_dict:
+            # the parameters of evaluation, such as amp_dtype, can still be changed without a config file. the config
+            # is built again with them, so the parameters derived from them, such as device from use_gpu or the eval
+            # settings from eval_args, follow them as well
+            config = Config(
+                model=config['model'],
+                dataset=config['dataset'],
+                config_dict={**config.external_config_dict, **config_dict}
+            )
     init_logger(config)
 
-    dataset = None
-    if dataset_file:
-        with open(dataset_file, 'rb') as f:
-            dataset = pickle.load(f)
-
     if dataloader_file:
-        train_data, valid_data, test_data = load_split_dataloaders(config)
-    else:
-        if dataset is None:
+        config['dataloaders_save_path'] = dataloader_file
+    # the dataloaders saved by an earlier run with the same dataset arguments are reused, without creating the dataset
+    dataset = None
+    dataloaders = load_split_dataloaders(config)
+    if dataloaders is None:
+        if dataset_file:
+            # the filtered dataset is only unpickled when the dataloaders have to be created from it
+            with open(dataset_file, 'rb') as f:
+                dataset = pickle.load(f)
+        else:
             dataset = create_dataset(config)
-        train_data, valid_data, test_data = data_preparation(config, dataset)
-
-    model = get_model(config['model'])(config, train_data.dataset).to(config['device'])
+        if eval_only:
+            train_dataset, valid_data = valid_data_preparation(config, dataset)
+            dataloaders = None, valid_data, None
+        else:
+            dataloaders = data_preparation(config, dataset)
+    train_data, valid_data, test_data = dataloaders
+    if train_data is not None:
+        train_dataset = train_data.dataset
+
+    model = get_model(config['model'])(config, train_dataset).to(config['device'])
     model.load_state_dict(checkpoint['state_dict'])
     model.load_other_parameter(checkpoint.get('other_parameter'))
 
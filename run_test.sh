@@ -23,4 +23,7 @@ echo "model tests finished"
 
 python -m pytest -v tests/data/test_dataset.py
 python -m pytest -v tests/data/test_dataloader.py
-echo "data tests finished"
\ No newline at end of file
+echo "data tests finished"
+
+python -m pytest -v tests/trainer/test_trainer.py
+echo "trainer tests finished"
\ No newline at end of file
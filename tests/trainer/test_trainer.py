@@ -0,0 +1,279 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import torch
+
+from recbole.config import Config
+from recbole.data import create_dataset, data_preparation
+from recbole.data.interaction import cat_interactions
+from recbole.trainer import Trainer
+from recbole.trainer.trainer import load_checkpoint
+from recbole.utils import init_seed, get_model, get_trainer
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+data_path = os.path.join(current_path, '../../recbole/dataset_example')
+properties_path = os.path.join(current_path, '../../recbole/properties/model')
+
+
+def new_trainer(model, checkpoint_dir, config_dict=None):
+    config_dict = {
+        'data_path': data_path,
+        'checkpoint_dir': checkpoint_dir,
+        'use_gpu': False,
+        'show_progress': False,
+        'state': 'ERROR',
+        'epochs': 1,
+        **(config_dict or {}),
+    }
+    # the sensitive attributes are loaded by the config of the fair models, which overrides the one of the dataset
+    config_file_list = [os.path.join(properties_path, f'{model}.yaml')]
+    config = Config(model=model, dataset='ml-100k', config_file_list=config_file_list, config_dict=config_dict)
+    init_seed(config['seed'], config['reproducibility'])
+    dataset = create_dataset(config)
+    train_data, valid_data, test_data = data_preparation(config, dataset)
+    init_seed(config['seed'], config['reproducibility'])
+    model = get_model(config['model'])(config, train_data.dataset).to(config['device'])
+    trainer = get_trainer(config['MODEL_TYPE'], config['model'])(config, model)
+    return trainer, train_data, valid_data, test_data
+
+
+def perturb(model):
+    with torch.no_grad():
+        for param in model.parameters():
+            param.add_(1.)
+
+
+def assert_state_dict_equal(test_case, state_dict, other_state_dict):
+    test_case.assertEqual(state_dict.keys(), other_state_dict.keys())
+    for key, value in state_dict.items():
+        test_case.assertTrue(torch.equal(value, other_state_dict[key]), key)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.trainer, self.train_data, _, _ = new_trainer('FOCF', self.checkpoint_dir)
+
+    def tearDown(self):
+        self.trainer.close()
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def _save(self):
+        state_dict = {key: value.clone() for key, value in self.trainer.model.state_dict().items()}
+        self.trainer._save_checkpoint(0, verbose=False)
+        # the model keeps being updated while the checkpoint is written
+        perturb(self.trainer.model)
+        return state_dict
+
+    def test_async_checkpoint_reload(self):
+        state_dict = self._save()
+        checkpoint = self.trainer._load_checkpoint(self.trainer.saved_model_file)
+        assert_state_dict_equal(self, state_dict, checkpoint['state_dict'])
+        self.assertEqual(checkpoint['epoch'], 0)
+        self.assertIn('optimizer', checkpoint)
+
+    def test_restore_from_memory(self):
+        state_dict = self._save()
+        with mock.patch('recbole.trainer.trainer.load_checkpoint', wraps=load_checkpoint) as loaded:
+            self.trainer._load_saved_model(self.trainer.saved_model_file)
+        loaded.assert_not_called()
+        assert_state_dict_equal(self, state_dict, self.trainer.model.state_dict())
+
+    def test_restore_from_disk(self):
+        state_dict = self._save()
+        self.trainer._saved_models.clear()
+        with mock.patch('recbole.trainer.trainer.load_checkpoint', wraps=load_checkpoint) as loaded:
+            self.trainer._load_saved_model(self.trainer.saved_model_file)
+        loaded.assert_called_once()
+        assert_state_dict_equal(self, state_dict, self.trainer.model.state_dict())
+
+    def test_close(self):
+        self._save()
+        self.trainer.close()
+        self.assertIsNone(self.trainer._save_executor)
+        self.assertFalse(self.trainer._snapshots)
+        self.assertIn(self.trainer.saved_model_file, self.trainer._saved_models)
+        # the next checkpoint starts the writer thread again
+        state_dict = self._save()
+        self.assertIsNotNone(self.trainer._save_executor)
+        checkpoint = self.trainer._load_checkpoint(self.trainer.saved_model_file)
+        assert_state_dict_equal(self, state_dict, checkpoint['state_dict'])
+
+    def test_regroup_optimizer_state(self):
+        params = list(self.trainer.model.parameters())
+        # the optimizers were built with a parameter group for each parameter before
+        optimizer = torch.optim.Adam([{'params': [param]} for param in params])
+        self.trainer.model.calculate_loss(next(iter(self.train_data))).backward()
+        optimizer.step()
+        self.assertNotEqual(len(optimizer.param_groups), len(self.trainer.optimizer.param_groups))
+        hyperparams = [group['weight_decay'] for group in self.trainer.optimizer.param_groups]
+        with mock.patch.object(self.trainer.logger, 'warning') as warning:
+            self.trainer._load_optimizer_state(self.trainer.optimizer, optimizer.state_dict())
+        warning.assert_called_once()
+        self.assertEqual(hyperparams, [group['weight_decay'] for group in self.trainer.optimizer.param_groups])
+        for param in params:
+            for key, value in optimizer.state[param].items():
+                self.assertTrue(torch.equal(value, self.trainer.optimizer.state[param][key]), key)
+
+    def test_optimizer_state_of_other_model(self):
+        # the model in the checkpoint has one more parameter
+        params = list(self.trainer.model.parameters()) + [torch.nn.Parameter(torch.zeros(1))]
+        optimizer = torch.optim.Adam([{'params': [param]} for param in params])
+        self.assertNotEqual(len(optimizer.param_groups), len(self.trainer.optimizer.param_groups))
+        with mock.patch.object(self.trainer.logger, 'warning') as warning:
+            self.trainer._load_optimizer_state(self.trainer.optimizer, optimizer.state_dict())
+        warning.assert_called_once()
+        self.assertFalse(self.trainer.optimizer.state)
+
+
+class TestSavedModel(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def test_save_sst_embed_from_memory(self):
+        self.trainer, train_data, valid_data, _ = new_trainer('PFCN_PMF', self.checkpoint_dir, {'save_sst_embed': True})
+        save_sst_embed = self.trainer._save_sst_embed
+
+        def check_save_sst_embed(data):
+            self.assertIn(self.trainer.saved_model_file, self.trainer._saved_models)
+            save_sst_embed(data)
+
+        with mock.patch.object(self.trainer, '_save_sst_embed', side_effect=check_save_sst_embed) as saved, \
+                mock.patch('recbole.trainer.trainer.load_checkpoint') as load_checkpoint:
+            self.trainer.fit(train_data, valid_data)
+        saved.assert_called_once()
+        load_checkpoint.assert_not_called()
+
+    def test_fairgo_evaluate_reads_checkpoint_once(self):
+        self.trainer, train_data, valid_data, test_data = new_trainer(
+            'FairGo_PMF', self.checkpoint_dir, {'n_layers': 2, 'pretrain_epochs': 1, 'save_sst_embed': False}
+        )
+        self.trainer.pretrain(train_data, valid_data)
+        # the checkpoints are read back from the files, as by a trainer which did not save them
+        self.trainer._saved_models.clear()
+        with mock.patch('recbole.trainer.trainer.load_checkpoint', wraps=load_checkpoint) as loaded:
+            result = self.trainer.evaluate(test_data, model_file=self.trainer.saved_pretrain_model_file)
+        loaded.assert_called_once()
+        self.assertTrue(any(key.startswith('pretrain-') for key in result))
+        self.assertTrue(any(key.startswith('finetune-') for key in result))
+
+
+class TestTrainEpoch(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.trainer, self.train_data, _, _ = new_trainer('FOCF', self.checkpoint_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def test_loss_of_shape_one(self):
+        calculate_loss = self.trainer.model.calculate_loss
+        train_loss = self.trainer._train_epoch(
+            self.train_data, 0, loss_func=lambda interaction: calculate_loss(interaction).reshape(1)
+        )
+        self.assertIsInstance(train_loss, float)
+        train_loss = self.trainer._train_epoch(
+            self.train_data, 1, loss_func=lambda interaction: (calculate_loss(interaction).reshape(1), )
+        )
+        self.assertIsInstance(train_loss, tuple)
+        self.assertEqual(len(train_loss), 1)
+
+    def test_nan_loss_stops_epoch(self):
+        calculate_loss = self.trainer.model.calculate_loss
+        batch_num = []
+
+        def nan_loss(interaction):
+            batch_num.append(len(batch_num))
+            return calculate_loss(interaction) * float('nan')
+
+        self.assertGreater(len(self.train_data), self.trainer.progress_refresh_step)
+        with self.assertRaises(ValueError):
+            self.trainer._train_epoch(self.train_data, 0, loss_func=nan_loss)
+        self.assertEqual(len(batch_num), self.trainer.progress_refresh_step)
+
+    def test_gradient_accumulation(self):
+        # the training batches of FOCF are grouped by user, so the ones of PFCN_PMF are taken with the same size
+        _, train_data, _, _ = new_trainer('PFCN_PMF', self.checkpoint_dir)
+        batches = []
+        for interaction in train_data:
+            if batches and len(interaction) != len(batches[0]):
+                break
+            batches.append(interaction)
+        self.assertGreaterEqual(len(batches), 2)
+        batches = batches[:2]
+        params = []
+        # the mean bpr loss of two accumulated batches is the one of the two batches together,
+        # sgd is used since the steps of adam hardly change with the scale of the gradients
+        for accumulation_steps, train_data in [(2, batches), (1, [cat_interactions(batches)])]:
+            trainer, _, _, _ = new_trainer(
+                'PFCN_PMF', self.checkpoint_dir, {'learner': 'sgd', 'gradient_accumulation_steps': accumulation_steps}
+            )
+            self.assertEqual(trainer.model.filter_mode, 'none')
+            # PFCNTrainer trains the filters of the sensitive attributes as well
+            Trainer._train_epoch(
+                trainer, train_data, 0, loss_func=lambda interaction: trainer.model.calculate_loss(interaction, None)
+            )
+            params.append(trainer.model.state_dict())
+        for key, value in params[0].items():
+            self.assertTrue(torch.allclose(value, params[1][key], atol=1e-6), key)
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+    def _new_trainer(self, mode):
+        eval_args = {'split': {'RS': [8, 1, 1]}, 'group_by': 'user', 'order': 'RO', 'mode': mode}
+        trainer, train_data, valid_data, _ = new_trainer('FOCF', self.checkpoint_dir, {'eval_args': eval_args})
+        trainer.eval_collector.data_collect(train_data)
+        return trainer, valid_data
+
+    @staticmethod
+    def _evaluate(trainer, valid_data):
+        # the negative items are sampled again in every evaluation
+        init_seed(trainer.config['seed'], trainer.config['reproducibility'])
+        return trainer.evaluate(valid_data)
+
+    def _evaluate_with_scores_buf(self, trainer, valid_data):
+        result = self._evaluate(trainer, valid_data)
+        scores_buf = trainer._scores_buf
+        self.assertIsNotNone(scores_buf)
+        # the buffer of the first evaluation is reused by the next one
+        self.assertEqual(self._evaluate(trainer, valid_data), result)
+        self.assertIs(trainer._scores_buf, scores_buf)
+        return result
+
+    def test_neg_sample_scores_buf(self):
+        trainer, valid_data = self._new_trainer('uni100')
+        result = self._evaluate_with_scores_buf(trainer, valid_data)
+
+        def new_scores_buf(user_num):
+            return torch.empty((user_num, trainer.tot_item_num), device=trainer.device)
+
+        with mock.patch.object(trainer, '_get_scores_buf', side_effect=new_scores_buf):
+            self.assertEqual(self._evaluate(trainer, valid_data), result)
+
+    def test_full_sort_scores_buf(self):
+        trainer, valid_data = self._new_trainer('full')
+        result = self._evaluate(trainer, valid_data)
+        self.assertIsNone(trainer._scores_buf)
+        # the models without full_sort_predict score the items of a few users at a time into the buffer
+        with mock.patch.object(trainer.model, 'full_sort_predict', side_effect=NotImplementedError):
+            self.assertEqual(self._evaluate_with_scores_buf(trainer, valid_data), result)
+
+
+if __name__ == '__main__':
+    unittest.main()